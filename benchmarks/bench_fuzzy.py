@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""比较两种模糊匹配阶段：difflib（FuzzyIndex）与 IDF加权的商户词索引（TokenIndex）
+
+准确率：在 config/category_mapping.yml 上做留一法——每个（规范化后的）键从索引中去掉后作为查询，
+看最佳匹配的分类是否与它自己的分类相同。
+速度：用合成的大映射（默认 50000 个键）测量每次查询的平均耗时，查询是换了门店编号和郊区的已有键，
+同时统计匹配到同一商户的比例。
+
+    python benchmarks/bench_fuzzy.py
+    python benchmarks/bench_fuzzy.py --keys 20000 --queries 2000 --no-normalize
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from category_manager import CategoryManager, FUZZY_INDEXES
+
+ROOT = Path(__file__).parent.parent
+
+def leave_one_out(keys, categories, method):
+    """返回 (正确, 错误, 无匹配, 平均耗时ms)"""
+    correct = wrong = missing = 0
+    elapsed = 0.0
+    for position, (key, category) in enumerate(zip(keys, categories)):
+        others = keys[:position] + keys[position + 1:]
+        index = FUZZY_INDEXES[method](others)
+        start = time.perf_counter()
+        match = index.best_match(key)
+        elapsed += time.perf_counter() - start
+        if match is None:
+            missing += 1
+        elif categories[keys.index(match)] == category:
+            correct += 1
+        else:
+            wrong += 1
+    return correct, wrong, missing, elapsed / len(keys) * 1000
+
+def synthetic_keys(count, seed=0):
+    """生成类似银行流水的映射键：商户名 + 门店编号 + 郊区 + 州"""
+    rng = np.random.default_rng(seed)
+    syllables = ['WOOL', 'BUN', 'STAR', 'MAR', 'KET', 'TON', 'BERG', 'FIELD', 'LY', 'CO', 'NINGS', 'WORTHS',
+                 'BAKE', 'HOUSE', 'MED', 'PET', 'FRESH', 'CAFE', 'GRILL', 'PHARM']
+    suburbs = [f"{rng.choice(syllables)}{rng.choice(syllables)}" for _ in range(400)]
+    merchants = {f"{rng.choice(syllables)}{rng.choice(syllables)}{rng.choice(syllables)} {rng.choice(syllables)}{rng.choice(syllables)}"
+                 for _ in range(count * 2)}
+    merchants = sorted(merchants)[:count]
+    return [f"{merchant} {rng.integers(1, 9999)} {rng.choice(suburbs)} {rng.choice(['VIC', 'NSW', 'QLD'])} AU"
+            for merchant in merchants]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the difflib and token fuzzy matching stages')
+    parser.add_argument('--mapping', default=str(ROOT / 'config' / 'category_mapping.yml'), help='Mapping used for accuracy')
+    parser.add_argument('--matching', default=str(ROOT / 'config' / 'matching.json'), help='Normalization config')
+    parser.add_argument('--no-normalize', action='store_true', help='Compare on the original descriptions')
+    parser.add_argument('--keys', type=int, default=50000, help='Keys in the synthetic mapping used for speed')
+    parser.add_argument('--queries', type=int, default=1000, help='Queries used for speed')
+    args = parser.parse_args()
+
+    cm = CategoryManager(mapping_file=args.mapping, patterns_file=str(ROOT / 'config' / 'pattern_mapping.json'),
+                         snapshot=False, matching_file=None if args.no_normalize else args.matching)
+    lookup = cm._get_normalized_lookup()
+    keys = list(lookup)
+    categories = [lookup[key] for key in keys]
+    print(f"Accuracy: leave-one-out over {len(keys)} keys of {args.mapping}"
+          f"{'' if args.no_normalize else ' (normalized)'}")
+    for method in FUZZY_INDEXES:
+        correct, wrong, missing, ms = leave_one_out(keys, categories, method)
+        print(f"  {method:8s} correct {correct:3d}  wrong {wrong:3d}  no match {missing:3d}  "
+              f"precision {correct / max(correct + wrong, 1):6.1%}  {ms:6.3f} ms/lookup")
+
+    rng = np.random.default_rng(1)
+    mapping_keys = synthetic_keys(args.keys)
+    # 查询：已有键换一个门店编号和郊区，保留商户名
+    queries = []
+    for key in rng.choice(mapping_keys, args.queries):
+        words = key.split()
+        queries.append(' '.join(words[:2] + [str(rng.integers(1, 9999)), words[3] + 'X'] + words[4:]))
+    print(f"\nSpeed: {len(mapping_keys)} synthetic keys, {len(queries)} queries")
+    for method in FUZZY_INDEXES:
+        start = time.perf_counter()
+        index = FUZZY_INDEXES[method](mapping_keys)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        matches = [index.best_match(query) for query in queries]
+        elapsed = time.perf_counter() - start
+        same_merchant = sum(
+            1 for query, match in zip(queries, matches) if match is not None and match.split()[:2] == query.split()[:2]
+        )
+        print(f"  {method:8s} build {build:6.2f} s  {elapsed / len(queries) * 1000:7.3f} ms/lookup  "
+              f"same merchant {same_merchant}/{len(queries)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""比较月度输出写入的峰值内存（RSS）：旧的 copy + rename + 重新排列 与 列投影 + I/O线程池
+
+每种方式在独立的子进程中运行：先生成多年的按月数据，把峰值RSS重置为当前值（Linux
+的 /proc/self/clear_refs），再写出全部月份，报告写入期间的峰值RSS和比写入前多出的部分。
+
+    python benchmarks/bench_output_memory.py --years 5 --rows 50000
+"""
+import argparse
+import contextlib
+import ctypes
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_processor import DataProcessor, OUTPUT_COLUMNS
+
+CONFIG_PATH = Path(__file__).parent.parent / 'config' / 'bank_config.json'
+
+def make_monthly_data(years, rows, seed=0):
+    """逐月生成与 merge_files 结果相同结构的数据"""
+    rng = np.random.default_rng(seed)
+    merchants = np.array([f"MERCHANT {i} SYDNEY NSW" for i in range(5000)], dtype=object)
+    categories = np.array(['groceries', 'coffee', 'transport', None], dtype=object)
+    monthly_data = {}
+    for year in range(2020, 2020 + years):
+        for month in range(1, 13):
+            start = pd.Timestamp(year, month, 1)
+            days = np.sort(rng.integers(0, 28, rows))
+            monthly_data[f"{year}{month:02d}"] = pd.DataFrame({
+                'date': start + pd.to_timedelta(days, unit='D'),
+                'description': merchants[rng.integers(0, len(merchants), rows)],
+                'amount': rng.normal(0, 80, rows).round(2),
+                'bank': 'CBA',
+                'month': f"{year}-{month:02d}",
+                'comment': categories[rng.integers(0, len(categories), rows)],
+            })
+    return monthly_data
+
+def legacy_save_monthly_files(monthly_data, output_dir):
+    """改动前的写入方式：每个月 copy，再 rename、添加列、重新排列（各复制一次）"""
+    for month, df in monthly_data.items():
+        df_output = df.copy()
+        if 'comment' not in df_output.columns:
+            df_output['comment'] = ''
+        df_output = df_output.rename(columns={'comment': 'category'})
+        df_output['comment'] = ''
+        df_output = df_output[OUTPUT_COLUMNS]
+        df_output.to_csv(Path(output_dir) / f"{month}.csv", index=False)
+
+def current_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def release_free_memory():
+    """把生成数据时释放的堆内存还给操作系统（glibc），否则写入时的分配会复用这些已驻留的页，测不出差别"""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def reset_peak_rss():
+    """把峰值RSS重置为当前RSS（仅Linux），使测量只包含写入阶段"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def run_mode(mode, years, rows, write_workers):
+    monthly_data = make_monthly_data(years, rows)
+    processor = DataProcessor(str(CONFIG_PATH))
+    with tempfile.TemporaryDirectory() as output_dir:
+        release_free_memory()
+        reset_peak_rss()
+        before = current_rss_kb()
+        start = time.perf_counter()
+        if mode == 'legacy':
+            legacy_save_monthly_files(monthly_data, output_dir)
+        else:
+            processor.save_monthly_files(monthly_data, output_dir, write_workers=write_workers)
+        elapsed = time.perf_counter() - start
+    return {'mode': mode, 'before_mb': before / 1024, 'peak_mb': peak_rss_kb() / 1024, 'seconds': elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark peak RSS of the monthly output writer')
+    parser.add_argument('--years', type=int, default=5, help='Years of monthly data (default: 5)')
+    parser.add_argument('--rows', type=int, default=50000, help='Transactions per month (default: 50000)')
+    parser.add_argument('--write-workers', type=int, nargs='+', default=[1, 4],
+                        help='I/O thread counts to measure for the current writer (default: 1 4)')
+    parser.add_argument('--mode', choices=['legacy', 'current'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # 子进程：只运行一种方式，把结果以JSON输出
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = run_mode(args.mode, args.years, args.rows, args.write_workers[0])
+        print(json.dumps(result))
+        return
+
+    print(f"{args.years} years x 12 months x {args.rows} rows = {args.years * 12 * args.rows:,} transactions")
+    # 旧方式不使用线程池；当前方式逐个报告每种写线程数，写线程越多，同时存在的编码缓冲区越多
+    runs = [('legacy', 1)] + [('current', write_workers) for write_workers in args.write_workers]
+    for mode, write_workers in runs:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--years', str(args.years), '--rows', str(args.rows),
+             '--write-workers', str(write_workers)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = mode if mode == 'legacy' else f"{mode} x{write_workers}"
+        print(f"{label:11s} data {result['before_mb']:7.1f} MB  peak {result['peak_mb']:7.1f} MB  "
+              f"(+{result['peak_mb'] - result['before_mb']:6.1f} MB while writing)  {result['seconds']:6.2f} s")
+
+if __name__ == '__main__':
+    main()
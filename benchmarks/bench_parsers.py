@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""单独测量每个已注册银行解析器的解析速度
+
+为每个解析器生成一个使用其列名的合成流水文件，然后计时 BankParser.parse()。
+
+    python benchmarks/bench_parsers.py --rows 200000
+    python benchmarks/bench_parsers.py --parser anz --repeat 5
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bank_parser import registered_parsers
+
+def make_statement(parser, rows, path, seed=0):
+    """生成一个符合解析器列映射的合成流水文件"""
+    rng = np.random.default_rng(seed)
+    days = rng.integers(1, 29, rows)
+    amounts = rng.normal(0, 80, rows).round(2)
+    data = {
+        parser.columns['date'][0]: [f"{day:02d}/08/2025" for day in days],
+        parser.columns['description'][0]: rng.choice([f"MERCHANT {i} SYDNEY" for i in range(2000)], rows),
+    }
+    if parser.debit_column or parser.credit_column:
+        data[parser.debit_column] = np.where(amounts < 0, -amounts, np.nan)
+        data[parser.credit_column] = np.where(amounts >= 0, amounts, np.nan)
+    else:
+        data[parser.columns['amount'][0]] = amounts
+    data['Balance'] = amounts.cumsum().round(2)
+    pd.DataFrame(data).to_csv(path, index=False)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark bank parsers')
+    arg_parser.add_argument('--rows', type=int, default=200000, help='Rows per synthetic statement')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Runs per parser (best time is reported)')
+    arg_parser.add_argument('--parser', action='append', help='Only benchmark these parsers')
+    args = arg_parser.parse_args()
+
+    parsers = registered_parsers()
+    names = args.parser or sorted(parsers)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in names:
+            parser = parsers[name]
+            path = Path(temp_dir) / f"{name}-202508.csv"
+            make_statement(parser, args.rows, path)
+
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                df = parser.parse(path)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{name:10s} {len(df):>9d} rows  {best * 1000:8.1f} ms  {len(df) / best:>12,.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
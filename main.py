@@ -4,87 +4,175 @@ from pathlib import Path
 from src.data_processor import DataProcessor
 from src.category_manager import CategoryManager
 from src.interactive_cli import InteractiveCLI
-from src.learning_mode import LearningMode
+from src.learning_mode import LearningMode, CONFLICT_POLICIES, find_learning_files
+from src.pipeline import categorize_months
+
+def print_date_parse_stats(processor):
+    """显示每家银行日期解析的格式和耗时"""
+    for bank, stats in processor.date_parse_stats().items():
+        print(f"Date parsing: {bank}: {stats['rows']} rows ({stats['unique']} unique, "
+              f"format {stats['format']}) in {stats['seconds'] * 1000:.1f} ms")
 
 def main():
     parser = argparse.ArgumentParser(description='Bank Transaction Merger and Categorizer')
     parser.add_argument('--input-dir', default='data/input', help='Input directory')
     parser.add_argument('--output-dir', default='data/output', help='Output directory')
+    parser.add_argument('--cache-dir', help='Directory for the incremental ingest and categorization caches (default: "cache" next to the input directory)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the ingest and categorization caches')
     parser.add_argument('--no-interactive', action='store_true', help='Skip interactive categorization')
     parser.add_argument('--month', help='Process specific month only (format: YYYYMM, e.g., 202408)')
     parser.add_argument('--list-months', action='store_true', help='List available months from input files')
-    parser.add_argument('--learn-from', help='Learn categories from an existing CSV file (same format as output)')
+    parser.add_argument('--cross-month', action='store_true', help='Ask about each unmapped description once across all months (most frequent first)')
+    parser.add_argument('--dedupe-mapping', action='store_true', help='Remove mappings that only differ from another one with the same category in volatile parts (see config/matching.json)')
+    parser.add_argument('--learn-from', help='Learn categories from existing CSV files (same format as output): a file, a directory or a glob pattern')
+    parser.add_argument('--learn-workers', type=int, default=1, help='Number of workers used to read learning files in parallel (default: 1, uses --ingest-pool)')
+    parser.add_argument('--conflict-policy', choices=CONFLICT_POLICIES, default='ask', help='How learning resolves conflicts with existing mappings (default: ask)')
+    parser.add_argument('--conflict-report', help='Write the conflicts found while learning to this JSON file')
+    parser.add_argument('--ingest-workers', type=int, default=1, help='Number of workers used to read input files in parallel (default: 1)')
+    parser.add_argument('--ingest-pool', choices=['thread', 'process'], default='thread', help='Worker pool type for parallel ingest and learning (default: thread)')
+    parser.add_argument('--stream', action='store_true', help='Stream input files in chunks with bounded memory (non-interactive)')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Rows per chunk in streaming mode (default: 100000)')
+    parser.add_argument('--output-format', choices=['csv', 'parquet', 'feather'], default='csv', help='Format of the monthly output files (parquet/feather require pyarrow)')
+    parser.add_argument('--dataset-dir', help='Also save all months as one columnar dataset partitioned by month')
+    parser.add_argument('--categorize-workers', type=int, default=1, help='Number of worker processes used to categorize months in parallel, with --no-interactive or --cross-month (default: 1)')
+    parser.add_argument('--write-workers', type=int, default=1, help='Number of I/O threads used to write monthly files, useful on slow or network storage (default: 1)')
     
     args = parser.parse_args()
     
-    # 初始化组件
-    processor = DataProcessor()
-    category_manager = CategoryManager()
+    # 缓存默认放在输入目录旁边（data/input -> data/cache），不同输入目录的缓存互不影响
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else Path(args.input_dir).parent / 'cache'
+    
+    # 初始化组件（CategoryManager 只构造一次，映射从二进制快照快速加载）
+    processor = DataProcessor(cache_dir=cache_dir)
+    category_manager = CategoryManager(cache_file=cache_dir / 'category_cache.json' if cache_dir else None, journal=True,
+                                       matching_file='config/matching.json')
     cli = InteractiveCLI(category_manager)
-    learning_mode = LearningMode(category_manager)
+    
+    # 合并规范化后重复的映射
+    if args.dedupe_mapping:
+        removed = category_manager.merge_normalized_duplicates()
+        category_manager.compact_journal()
+        print(f"Removed {removed} duplicate mappings, {len(category_manager.mapping)} remain")
+        return 0
     
     # 如果是学习模式
     if args.learn_from:
-        if not Path(args.learn_from).exists():
+        learning_files = find_learning_files(args.learn_from)
+        if not learning_files or not all(file_path.exists() for file_path in learning_files):
             print(f"Error: Learning file '{args.learn_from}' not found")
             return 1
         
+        learning_mode = LearningMode(category_manager, conflict_policy=args.conflict_policy,
+                                     interactive=not args.no_interactive)
         print(f"Learning mode: Processing '{args.learn_from}'")
-        success = learning_mode.learn_from_csv(args.learn_from)
+        try:
+            success = learning_mode.learn_from_files(learning_files, workers=args.learn_workers, pool=args.ingest_pool)
+        finally:
+            category_manager.compact_journal()
+            if args.conflict_report:
+                learning_mode.write_conflict_report(args.conflict_report)
         return 0 if success else 1
     
-    args = parser.parse_args()
-    
-    # 初始化组件
-    processor = DataProcessor()
-    category_manager = CategoryManager()
-    cli = InteractiveCLI(category_manager)
-    
     try:
-        # 1. 合并所有银行文件，按月分组
-        print("Merging bank transaction files...")
-        monthly_data = processor.merge_files(args.input_dir)
-        
-        # 如果用户想列出可用月份
+        # 如果用户想列出可用月份（只看文件名和行数，不解析CSV）
         if args.list_months:
+            available_months = processor.list_months(args.input_dir)
             print("\nAvailable months:")
-            for month in sorted(monthly_data.keys()):
-                count = len(monthly_data[month])
-                banks = monthly_data[month]['bank'].unique()
-                print(f"  {month}: {count} transactions from {', '.join(banks)}")
+            for month, info in available_months.items():
+                print(f"  {month}: {info['transactions']} transactions from {', '.join(info['banks'])}")
             return 0
         
-        # 如果用户指定了特定月份
+        # 如果用户指定了特定月份，读取CSV之前就按文件名筛选
+        months = None
         if args.month:
-            if args.month not in monthly_data:
+            available_months = processor.available_months(args.input_dir)
+            if args.month not in available_months:
                 print(f"Month {args.month} not found in input files.")
-                print("Available months:", ", ".join(sorted(monthly_data.keys())))
+                print("Available months:", ", ".join(available_months))
+                return 1
+            months = [args.month]
+        
+        # 流式模式：分块读取、分类并直接写出月度文件，不在内存中保留完整历史
+        if args.stream:
+            if args.output_format != 'csv' or args.dataset_dir:
+                print("Streaming mode only writes CSV files; --output-format and --dataset-dir are not supported.")
                 return 1
-            # 只处理指定的月份
-            monthly_data = {args.month: monthly_data[args.month]}
+            if not args.no_interactive:
+                print("Streaming mode does not support interactive categorization; running non-interactively.")
+            print("Streaming bank transaction files...")
+            saved_files, row_counts = processor.stream_monthly_files(
+                category_manager, args.input_dir, args.output_dir, chunksize=args.chunksize, months=months
+            )
+            print_date_parse_stats(processor)
+            print("\nSummary:")
+            print(f"Total transactions: {sum(row_counts.values())}")
+            print(f"Months processed: {len(row_counts)}")
+            print(f"Files saved: {len(saved_files)}")
+            
+            cache_stats = category_manager.cache_stats()
+            print(f"Category cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+            category_manager.save_cache()
+            return 0
+        
+        # 1. 合并银行文件，按月分组
+        print("Merging bank transaction files...")
+        monthly_data = processor.merge_files(
+            args.input_dir, workers=args.ingest_workers, pool=args.ingest_pool, months=months
+        )
+        print_date_parse_stats(processor)
+        if args.month:
             print(f"Processing only month: {args.month}")
         
         total_transactions = sum(len(df) for df in monthly_data.values())
         total_banks = len(set(bank for df in monthly_data.values() for bank in df['bank'].unique()))
         print(f"Processed {total_transactions} transactions from {total_banks} banks across {len(monthly_data)} months")
         
-        # 2. 处理每个月的数据
+        # 2. 处理每个月的数据（--categorize-workers > 1 时各月份在进程池中并行分类）
+        # 逐月询问时，前面月份的回答会改变后面月份的分类，并行分类会用过期的映射，所以逐月分类
+        categorize_workers = args.categorize_workers
+        if categorize_workers > 1 and not args.no_interactive and not args.cross_month:
+            print("Note: --categorize-workers needs --no-interactive or --cross-month, categorizing months one by one")
+            categorize_workers = 1
         all_processed_data = {}
-        for month, df in monthly_data.items():
-            print(f"\nProcessing month {month}...")
-            
-            # 应用已有分类
-            df = category_manager.apply_categories(df)
-            
-            # 交互式分类更新
-            if not args.no_interactive:
-                df = cli.update_categories(df, month)
-            
-            all_processed_data[month] = df
+        def processed_months():
+            for month, df in categorize_months(monthly_data, category_manager, workers=categorize_workers):
+                print(f"\nProcessing month {month}...")
+                
+                # 交互式分类更新（跨月份模式在所有月份分类完成后统一询问）
+                if not args.no_interactive and not args.cross_month:
+                    df = cli.update_categories(df, month)
+                
+                all_processed_data[month] = df
+                yield month, df
         
-        # 3. 保存每月的结果文件
-        print(f"\nSaving monthly files...")
-        saved_files = processor.save_monthly_files(all_processed_data, args.output_dir)
+        # 3. 保存每月的结果文件（输入文件、映射和模式都没有变化的月份不再重写）
+        if args.no_interactive:
+            # 映射在本次运行中不会改变：每个月份分类完成后立即写出，与其他月份的分类重叠
+            content_hash = category_manager.content_hash()
+            fingerprints = {month: processor.month_fingerprint(month, content_hash) for month in monthly_data}
+            saved_files = processor.save_monthly_files(
+                processed_months(), args.output_dir, fingerprints, args.output_format, write_workers=args.write_workers
+            )
+        else:
+            # 交互式分类会修改映射：全部月份处理完后再计算指纹并保存
+            for _ in processed_months():
+                pass
+            if args.cross_month:
+                print("\nReviewing unmapped descriptions across all months...")
+                cli.update_all_categories(all_processed_data)
+            print(f"\nSaving monthly files...")
+            content_hash = category_manager.content_hash()
+            fingerprints = {month: processor.month_fingerprint(month, content_hash) for month in all_processed_data}
+            saved_files = processor.save_monthly_files(
+                all_processed_data, args.output_dir, fingerprints, args.output_format, write_workers=args.write_workers
+            )
+        if args.dataset_dir:
+            dataset_format = 'feather' if args.output_format == 'feather' else 'parquet'
+            processor.save_dataset(
+                all_processed_data, args.dataset_dir, fingerprints, dataset_format, write_workers=args.write_workers
+            )
         
         # 4. 显示总体统计信息
         print(f"\nSummary:")
@@ -98,9 +186,16 @@ def main():
             amount_sum = df['amount'].sum()
             print(f"  {month}: {total} transactions, ${amount_sum:.2f}, {categorized}/{total} categorized")
         
+        cache_stats = category_manager.cache_stats()
+        print(f"Category cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        category_manager.save_cache()
+        
     except Exception as e:
         print(f"Error: {e}")
         return 1
+    finally:
+        # 退出时把本次交互的日志合并进映射文件
+        category_manager.compact_journal()
     
     return 0
 
@@ -1,50 +1,144 @@
 import pandas as pd
 from pathlib import Path
 
+# 标准化后的列
+STANDARD_COLUMNS = ['date', 'description', 'amount']
+
 class BankParser:
-    """银行特定的数据解析器"""
+    """银行特定的数据解析器
+    
+    用列映射描述一家银行的CSV格式：每个标准列（date/description/amount）对应一个或多个
+    候选的原始列名（不区分大小写，按顺序取第一个存在的列，标准列名本身总是最后一个候选）。
+    有 debit_column/credit_column 时金额由借贷两列计算：credit - debit。
+    解析器不保存任何与单个文件有关的状态，可以在多个文件和线程之间共享。
+    """
+    
+    def __init__(self, name, columns=None, debit_column=None, credit_column=None):
+        self.name = name
+        self.columns = {}
+        for field in STANDARD_COLUMNS:
+            candidates = (columns or {}).get(field, [])
+            if isinstance(candidates, str):
+                candidates = [candidates]
+            self.columns[field] = list(candidates) + [field]
+        self.debit_column = debit_column
+        self.credit_column = credit_column
+    
+    @classmethod
+    def from_config(cls, name, config):
+        """从 bank_config.json 中的 "parser" 配置创建解析器"""
+        return cls(
+            name,
+            columns=config.get('columns'),
+            debit_column=config.get('debit_column'),
+            credit_column=config.get('credit_column'),
+        )
+    
+    def resolve_columns(self, header, filename=''):
+        """返回 {标准列: 原始列名}，借贷两列分别以 debit/credit 为键"""
+        source_columns = {}
+        for column in header:
+            source_columns.setdefault(column.lower(), column)
+        
+        def find(candidates):
+            for candidate in candidates:
+                if candidate.lower() in source_columns:
+                    return source_columns[candidate.lower()]
+            return None
+        
+        layout = {field: find(candidates) for field, candidates in self.columns.items()}
+        if self.debit_column or self.credit_column:
+            debit = find([self.debit_column]) if self.debit_column else None
+            credit = find([self.credit_column]) if self.credit_column else None
+            if debit is not None or credit is not None:
+                # 借贷分列时忽略金额列
+                layout['amount'] = None
+                layout['debit'] = debit
+                layout['credit'] = credit
+        
+        if layout['date'] is None or layout['description'] is None or (
+                layout['amount'] is None and layout.get('debit') is None and layout.get('credit') is None):
+            raise ValueError(f"Missing required columns in {filename}")
+        return {field: column for field, column in layout.items() if column is not None}
+    
+    def read_spec(self, header, read_config=None, filename=''):
+        """生成 pd.read_csv 的参数：只读取需要的列，并固定列类型"""
+        read_config = read_config or {}
+        layout = self.resolve_columns(header, filename)
+        usecols = read_config.get('usecols') or list(layout.values())
+        
+        # 日期先按字符串读取，由日期解析阶段统一处理
+        dtypes = {'date': 'str', 'description': 'str', 'amount': 'float64', 'debit': 'float64', 'credit': 'float64'}
+        if read_config.get('description_dtype') == 'category':
+            dtypes['description'] = 'category'
+        dtypes.update(read_config.get('dtype', {}))
+        dtype = {layout.get(column, column): value for column, value in dtypes.items()}
+        dtype = {column: value for column, value in dtype.items() if column in usecols}
+        return {'usecols': usecols, 'dtype': dtype}
+    
+    def normalize(self, df, filename=''):
+        """把读取的数据块整列映射为 date/description/amount（不逐行处理）"""
+        layout = self.resolve_columns(df.columns, filename)
+        result = pd.DataFrame({field: df[layout[field]] for field in ('date', 'description')})
+        if 'amount' in layout:
+            result['amount'] = df[layout['amount']]
+        else:
+            # 合并借贷列为amount
+            credit = df[layout['credit']].fillna(0) if 'credit' in layout else 0
+            debit = df[layout['debit']].fillna(0) if 'debit' in layout else 0
+            result['amount'] = credit - debit
+        return result
+    
+    def parse(self, file_path, read_config=None):
+        """独立解析一个文件，返回 date/description/amount 三列（日期仍为字符串）"""
+        header = pd.read_csv(file_path, nrows=0).columns
+        df = pd.read_csv(file_path, **self.read_spec(header, read_config, Path(file_path).name))
+        return self.normalize(df, Path(file_path).name)
     
     @staticmethod
     def parse_cba(file_path):
         """解析CBA银行流水"""
-        df = pd.read_csv(file_path)
-        # CBA特定的列名映射
-        column_mapping = {
-            'Date': 'date',
-            'Description': 'description', 
-            'Amount': 'amount'
-        }
-        df = df.rename(columns=column_mapping)
-        return df
+        return get_parser('cba').parse(file_path)
     
     @staticmethod
     def parse_anz(file_path):
         """解析ANZ银行流水"""
-        df = pd.read_csv(file_path)
-        # ANZ特定的列名映射
-        column_mapping = {
-            'Transaction Date': 'date',
-            'Narrative': 'description',
-            'Debit': 'debit',
-            'Credit': 'credit'
-        }
-        df = df.rename(columns=column_mapping)
-        
-        # 合并借贷列为amount
-        df['amount'] = df['credit'].fillna(0) - df['debit'].fillna(0)
-        df = df.drop(['debit', 'credit'], axis=1)
-        
-        return df
+        return get_parser('anz').parse(file_path)
     
     @staticmethod
     def parse_westpac(file_path):
         """解析Westpac银行流水"""
-        df = pd.read_csv(file_path)
-        # Westpac特定的列名映射
-        column_mapping = {
-            'Date': 'date',
-            'Memo': 'description',
-            'Amount': 'amount'
-        }
-        df = df.rename(columns=column_mapping)
-        return df
+        return get_parser('westpac').parse(file_path)
+
+# 按银行代码（文件名中的银行部分）注册的解析器
+_PARSERS = {}
+
+def register_parser(bank_code, parser):
+    """注册银行解析器，bank_code 与 parse_filename 得到的银行代码一致（小写）"""
+    _PARSERS[bank_code.lower()] = parser
+
+def registered_parsers():
+    """返回所有已注册的解析器 {银行代码: 解析器}"""
+    return dict(_PARSERS)
+
+def get_parser(bank_code, config=None):
+    """查找银行的解析器
+
+    config 是 bank_config.json 中的 "parser" 配置：字典表示直接声明的列映射，
+    字符串表示使用某个已注册的解析器；没有配置时按银行代码查找，找不到则使用通用解析器。
+    """
+    if isinstance(config, dict):
+        return BankParser.from_config(bank_code, config)
+    if config is not None:
+        if config.lower() not in _PARSERS:
+            raise ValueError(f"Unknown parser '{config}' for bank '{bank_code}'")
+        return _PARSERS[config.lower()]
+    return _PARSERS.get(bank_code.lower(), _PARSERS['generic'])
+
+# 通用格式：Date, Description, Amount（不区分大小写）
+register_parser('generic', BankParser('generic'))
+register_parser('cba', BankParser('cba', columns={'date': 'Date', 'description': 'Description', 'amount': 'Amount'}))
+register_parser('anz', BankParser(
+    'anz', columns={'date': 'Transaction Date', 'description': 'Narrative'}, debit_column='Debit', credit_column='Credit'
+))
+register_parser('westpac', BankParser('westpac', columns={'date': 'Date', 'description': 'Memo', 'amount': 'Amount'}))
@@ -1,10 +1,158 @@
 import json
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
 from pathlib import Path
-import difflib
 import re
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+try:
+    from .fuzzy_index import FuzzyIndex
+    from .token_index import TokenIndex
+    from .pattern_matcher import PatternMatcher
+    from .file_utils import atomic_open
+    from .normalizer import DescriptionNormalizer
+except ImportError:
+    # For when running tests or standalone
+    from fuzzy_index import FuzzyIndex
+    from token_index import TokenIndex
+    from pattern_matcher import PatternMatcher
+    from file_utils import atomic_open
+    from normalizer import DescriptionNormalizer
+
+# 内置的智能模式，按优先级排列
+BUILT_IN_PATTERNS = [
+    # 常见超市/杂货店
+    ('groceries', ['WOOLWORTHS', 'COLES', 'IGA', 'ALDI', 'SUPERMARKET', 'GROCERIES']),
+    # 咖啡相关
+    ('coffee', ['COFFEE', 'STARBUCKS', 'CAFE', 'ESPRESSO', '咖啡']),
+    # 快餐
+    ('fast food', ['MCDONALD', 'KFC', 'BURGER KING', 'SUBWAY', 'DOMINO', 'PIZZA', '麦当劳']),
+    # 工资/收入
+    ('income', ['SALARY', 'WAGE', 'PAY', 'INCOME', 'DEPOSIT', 'TRANSFER IN']),
+    # 银行费用
+    ('bank fees', ['BANK FEE', 'ATM FEE', 'MONTHLY FEE', 'ACCOUNT FEE']),
+    # 交通
+    ('transport', ['UBER', 'TAXI', 'TRAIN', 'BUS', 'METRO', 'TRANSPORT', 'PETROL', 'FUEL']),
+]
+
+# 可选的模糊匹配阶段，在 config/matching.json 的 "fuzzy": {"method": ...} 中选择
+#   difflib: 字符n-gram候选 + SequenceMatcher 相似度（默认）
+#   token: 按IDF加权的商户词索引
+FUZZY_INDEXES = {
+    'difflib': FuzzyIndex,
+    'token': TokenIndex,
+}
+
+def load_matching_config(matching_file):
+    """读取 matching.json（规范化规则、模式匹配选项和模糊匹配阶段），文件不存在时返回空配置"""
+    if not matching_file or not Path(matching_file).exists():
+        return {}
+    with open(matching_file, encoding='utf-8') as f:
+        return json.load(f)
+
+# 匹配逻辑变化时修改此版本号，使持久化的分类缓存失效
+CACHE_FORMAT_VERSION = 2
+
+# 二进制快照格式版本，快照内容结构变化时修改
+SNAPSHOT_FORMAT_VERSION = 4
+
+def _category_lookup(mapping):
+    """映射（新格式为字典，旧格式为字符串）转为 描述->分类 的字典"""
+    return {
+        description: value['category'] if isinstance(value, dict) else value
+        for description, value in mapping.items()
+    }
+
+def _broadcast_categories(descriptions, categorize_unique):
+    """对描述去重，用 categorize_unique 对唯一值分类，再按编码广播回每一行"""
+    codes, uniques = pd.factorize(descriptions)
+    unique_categories = categorize_unique(pd.Series(uniques, dtype=object))
+    return expand_categories(codes, unique_categories, descriptions.index)
+
+def expand_categories(codes, unique_categories, index):
+    """把唯一值的分类按 pd.factorize 的编码展开为每一行的分类"""
+    # 最后一个位置留给缺失的描述 (factorize 编码为 -1)
+    lookup = np.empty(len(unique_categories) + 1, dtype=object)
+    lookup[:-1] = unique_categories
+    lookup[-1] = None
+    return pd.Series(lookup[codes], index=index, dtype=object)
+
+def _match_exact(uniques, category_lookup, normalizer=None, normalized_lookup=None):
+    """直接匹配：先按原始描述、再按规范化的描述与映射做向量化join，返回 (分类数组, 仍需匹配的文本描述)"""
+    result = np.full(len(uniques), None, dtype=object)
+    exact = uniques.map(category_lookup)
+    found = exact.notna().to_numpy()
+    result[found] = exact.to_numpy()[found]
+    
+    pending = uniques[~found]
+    is_text = pending.map(lambda value: isinstance(value, str)).astype(bool)
+    pending = pending[is_text]
+    
+    if normalizer is not None and normalizer.enabled and len(pending):
+        exact = normalizer.normalize_series(pending).map(normalized_lookup)
+        hits = exact.notna().to_numpy()
+        result[pending.index[hits]] = exact.to_numpy()[hits]
+        pending = pending[~hits]
+    return result, pending
+
+def _match_rules(pending, uniques, result, pattern_matcher, fuzzy_index, normalized_lookup, normalizer):
+    """对未直接命中的描述依次做模式匹配和模糊匹配，结果写入 result"""
+    # 模式匹配：对剩余描述用编译好的自动机单遍扫描
+    matched = pending.str.upper().map(pattern_matcher.match)
+    hits = matched.notna().to_numpy() & matched.astype(bool).to_numpy()
+    result[pending.index[hits]] = matched.to_numpy()[hits]
+    unmatched = pending[~hits]
+    
+    # 模糊匹配：只处理前面都没有命中的描述
+    # 模糊索引的键是规范化后的描述；分类有冲突的规范化键没有分类，不作为模糊匹配的结果
+    for position in unmatched.index:
+        close_match = fuzzy_index.best_match(normalizer.normalize(uniques[position]))
+        if close_match is not None:
+            result[position] = normalized_lookup.get(close_match)
+
+class CategorySnapshot:
+    """CategoryManager 的只读快照：直接映射（原始和规范化的）、编译好的模式匹配器、模糊索引和已缓存的分类结果
+    
+    分类结果与创建快照时的 CategoryManager 相同。快照可以被pickle，发送给工作进程后
+    只读使用，不修改映射，也不写任何文件。
+    """
+    
+    def __init__(self, category_lookup, pattern_matcher, fuzzy_index, cached=None,
+                 normalizer=None, normalized_lookup=None):
+        self.category_lookup = category_lookup
+        self.pattern_matcher = pattern_matcher
+        self.fuzzy_index = fuzzy_index
+        self.cached = cached or {}
+        self.normalizer = normalizer or DescriptionNormalizer(enabled=False)
+        self.normalized_lookup = category_lookup if normalized_lookup is None else normalized_lookup
+    
+    def categorize_series(self, descriptions):
+        """批量分类，与 CategoryManager.categorize_series 相同"""
+        return _broadcast_categories(descriptions, self.categorize_unique)
+    
+    def categorize_unique(self, uniques):
+        """对去重后的描述分类，返回分类数组"""
+        result, pending = _match_exact(uniques, self.category_lookup, self.normalizer, self.normalized_lookup)
+        
+        if self.cached:
+            hits = pending.isin(self.cached.keys()).to_numpy()
+            result[pending.index[hits]] = pending[hits].map(self.cached).to_numpy()
+            pending = pending[~hits]
+        
+        _match_rules(pending, uniques, result, self.pattern_matcher, self.fuzzy_index,
+                     self.normalized_lookup, self.normalizer)
+        return result
 
 class CategoryManager:
-    def __init__(self, mapping_file="config/category_mapping.yml", patterns_file="config/pattern_mapping.json"):
+    def __init__(self, mapping_file="config/category_mapping.yml", patterns_file="config/pattern_mapping.json",
+                 combine_regex=False, cache_file=None, cache_size=10000,
+                 journal=False, journal_compact_bytes=64 * 1024, snapshot=True,
+                 matching_file=None):
         # If a specific mapping file is provided, use it directly
         provided_mapping_file = Path(mapping_file)
         
@@ -30,14 +178,143 @@ class CategoryManager:
             self.use_yaml = str(provided_mapping_file).endswith('.yml') or str(provided_mapping_file).endswith('.yaml')
         
         self.patterns_file = Path(patterns_file)
+        
+        # 批量模式下延迟写入，退出批量时统一保存
+        self._batch_depth = 0
+        self._mapping_dirty = False
+        self._patterns_dirty = False
+        
+        # 追加式日志：每次修改只追加一条记录，压缩时再合并进映射文件
+        self.journal = journal
+        self.journal_file = self.mapping_file.with_name(self.mapping_file.name + '.journal')
+        self.journal_compact_bytes = journal_compact_bytes
+        
+        # 映射文件的二进制快照（含预先构建的索引），用于快速启动
+        self.snapshot_file = self.mapping_file.with_name(self.mapping_file.name + '.snapshot') if snapshot else None
+        self._loaded_fuzzy_index = None
+        
+        # 描述规范化：直接匹配的键和模糊索引使用规范化后的描述，映射文件保留原始描述
+        matching = load_matching_config(matching_file)
+        self.normalizer = DescriptionNormalizer(**matching.get('normalization', {'enabled': False}))
+        
+        # 模糊匹配阶段：{"method": "difflib" | "token", 其余为索引的参数}
+        self.fuzzy_config = dict(matching.get('fuzzy', {}))
+        self.fuzzy_method = self.fuzzy_config.pop('method', 'difflib')
+        if self.fuzzy_method not in FUZZY_INDEXES:
+            raise ValueError(f"Unknown fuzzy method '{self.fuzzy_method}', expected one of {sorted(FUZZY_INDEXES)}")
+        self._category_lookup = None
+        self._normalized_index = None
+        
         self.mapping = self.load_mapping()
         self.patterns = self.load_patterns()
+        self.fuzzy_index = self._loaded_fuzzy_index
+        if self.fuzzy_index is None:
+            self.fuzzy_index = self._new_fuzzy_index(self.match_keys(list(self.mapping)))
+        self._replay_mapping_journal()
+        # REGEX: 模式合并为一个交替表达式，matching.json 的 "patterns": {"combine_regex": ...} 优先于参数
+        self.combine_regex = bool(matching.get('patterns', {}).get('combine_regex', combine_regex))
+        self.pattern_matcher = self._compile_patterns()
+        
+        # 分类结果的LRU缓存，映射或模式变化时通过版本号失效
+        self.version = 0
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+        self._cache_version = self.version
+        self.cache_file = Path(cache_file) if cache_file else None
+        if self.cache_file:
+            self.load_cache()
     
     def load_mapping(self):
-        """加载描述->分类映射"""
+        """加载描述->分类映射（日志中尚未压缩的修改由 _replay_mapping_journal 在索引建好后重放）"""
+        return self._load_mapping_file()
+    
+    def _replay_mapping_journal(self):
+        """按顺序重放日志中的映射修改，与 add_mapping 走同一路径，重启后的分类与崩溃前一致"""
+        for record in self._read_journal('mapping'):
+            self._store_mapping(record['description'], record['category'], record.get('comment', ''))
+            self._mapping_dirty = True
+    
+    def _load_mapping_file(self):
+        """从映射文件加载；二进制快照是最新的时候直接使用快照"""
         if not self.mapping_file.exists():
             return {}
         
+        if self.snapshot_file is None:
+            return self._parse_mapping_file()
+        
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            self._loaded_fuzzy_index = FUZZY_INDEXES[self.fuzzy_method].from_state(snapshot['fuzzy_index'])
+            self._normalized_index = snapshot['normalized_index']
+            return snapshot['mapping']
+        
+        mapping = self._parse_mapping_file()
+        keys = self.match_keys(list(mapping))
+        self._loaded_fuzzy_index = self._new_fuzzy_index(keys)
+        if self.normalizer.enabled:
+            self._normalized_index = self._build_normalized_index(_category_lookup(mapping), keys)
+        self._write_snapshot(mapping, self._loaded_fuzzy_index, self._normalized_index)
+        return mapping
+    
+    def _snapshot_header(self):
+        """快照头：映射文件的 mtime、大小和内容哈希"""
+        stat = self.mapping_file.stat()
+        with open(self.mapping_file, 'rb') as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        return {
+            'format': SNAPSHOT_FORMAT_VERSION,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size,
+            'source_sha256': source_hash,
+            # 模糊索引的键取决于规范化规则，索引结构取决于模糊匹配阶段
+            'normalization': self.normalizer.config_key(),
+            'fuzzy': self._fuzzy_config_key(),
+        }
+    
+    def _read_snapshot(self):
+        """读取与映射文件内容一致的快照，不存在或已过期时返回None"""
+        if not self.snapshot_file.exists():
+            return None
+        
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                header = pickle.load(f)
+                current = self._snapshot_header()
+                # 只比较内容：mtime变化但内容相同（例如git checkout）时快照仍然有效
+                if any(header.get(key) != current[key] for key in ('format', 'source_size', 'source_sha256', 'normalization', 'fuzzy')):
+                    return None
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable mapping snapshot {self.snapshot_file}: {e}")
+            return None
+    
+    def _write_snapshot(self, mapping, fuzzy_index, normalized_index=None):
+        """把映射和索引写入二进制快照（先写头，读取时可以不反序列化正文就判断是否过期）
+        
+        规范化启用时同时保存规范化索引，启动后第一次查询不用再规范化所有键。
+        """
+        try:
+            with atomic_open(self.snapshot_file, 'wb') as f:
+                pickle.dump(self._snapshot_header(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(
+                    {'mapping': mapping, 'fuzzy_index': fuzzy_index.to_state(), 'normalized_index': normalized_index},
+                    f, protocol=pickle.HIGHEST_PROTOCOL
+                )
+        except OSError as e:
+            # 快照只是加速手段，写不了不影响正常使用
+            print(f"Warning: Could not write mapping snapshot {self.snapshot_file}: {e}")
+    
+    def _new_fuzzy_index(self, keys):
+        """按配置的模糊匹配阶段创建索引"""
+        return FUZZY_INDEXES[self.fuzzy_method](keys, **self.fuzzy_config)
+    
+    def _fuzzy_config_key(self):
+        return json.dumps([self.fuzzy_method, self.fuzzy_config], sort_keys=True)
+    
+    def _parse_mapping_file(self):
+        """解析YAML或JSON映射文件"""
         if self.use_yaml:
             return self._load_yaml_mapping()
         else:
@@ -88,21 +365,62 @@ class CategoryManager:
         return mapping
     
     def load_patterns(self):
-        """加载模式->分类映射"""
+        """加载模式->分类映射，并重放日志中尚未压缩的修改"""
+        patterns = {}
         if self.patterns_file.exists():
             with open(self.patterns_file) as f:
-                return json.load(f)
-        return {}
+                patterns = json.load(f)
+        for record in self._read_journal('pattern'):
+            patterns[record['pattern']] = record['category']
+            self._patterns_dirty = True
+        return patterns
+    
+    def _read_journal(self, record_type):
+        """读取日志中指定类型的记录"""
+        if not self.journal_file.exists():
+            return []
+        
+        records = []
+        with open(self.journal_file, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时可能留下写了一半的最后一行
+                    continue
+                if record.get('type') == record_type:
+                    records.append(record)
+        return records
+    
+    def _append_journal(self, *records):
+        """向日志追加记录（一次写入，与映射大小无关），日志过大时自动压缩"""
+        self.journal_file.parent.mkdir(exist_ok=True)
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        if self.journal_file.stat().st_size >= self.journal_compact_bytes:
+            self.compact_journal()
+    
+    def compact_journal(self):
+        """把日志中的修改合并进映射和模式文件，然后删除日志"""
+        self.flush()
     
     def save_mapping(self):
-        """保存映射到文件"""
+        """保存映射到文件（原子写入）"""
+        self._mapping_dirty = False
         self.mapping_file.parent.mkdir(exist_ok=True)
         
         if self.use_yaml:
             self._save_yaml_mapping()
         else:
-            with open(self.mapping_file, 'w') as f:
+            with atomic_open(self.mapping_file) as f:
                 json.dump(self.mapping, f, indent=2, ensure_ascii=False)
+        
+        if self.snapshot_file is not None:
+            self._write_snapshot(self.mapping, self.fuzzy_index,
+                                 self._get_normalized_index() if self.normalizer.enabled else None)
     
     def _save_yaml_mapping(self):
         """保存映射到YAML文件"""
@@ -120,7 +438,7 @@ class CategoryManager:
                 categories[mapping_value].append((description, ''))
         
         # Write to YAML file with comments
-        with open(self.mapping_file, 'w', encoding='utf-8') as f:
+        with atomic_open(self.mapping_file) as f:
             for category in sorted(categories.keys()):
                 f.write(f'- {category}\n')
                 for description, comment in sorted(categories[category], key=lambda x: x[0]):
@@ -132,13 +450,24 @@ class CategoryManager:
                         f.write(f'  - "{escaped_desc}"\n')
     
     def save_patterns(self):
-        """保存模式映射到文件"""
+        """保存模式映射到文件（原子写入）"""
+        self._patterns_dirty = False
         self.patterns_file.parent.mkdir(exist_ok=True)
-        with open(self.patterns_file, 'w') as f:
+        with atomic_open(self.patterns_file) as f:
             json.dump(self.patterns, f, indent=2, ensure_ascii=False)
     
     def get_category(self, description):
-        """获取描述对应的分类"""
+        """获取描述对应的分类（带LRU缓存）"""
+        found, category = self._cache_lookup(description)
+        if found:
+            return category
+        
+        category = self._get_category_uncached(description)
+        self._cache_store(description, category)
+        return category
+    
+    def _get_category_uncached(self, description):
+        """按 直接匹配 -> 模式匹配 -> 模糊匹配 的顺序获取分类"""
         # 1. 直接匹配
         if description in self.mapping:
             mapping_value = self.mapping[description]
@@ -148,87 +477,34 @@ class CategoryManager:
             else:
                 return mapping_value
         
+        # 直接匹配规范化后的描述（去掉日期、卡号、门店编号等）
+        key = self.normalizer.normalize(description)
+        if self.normalizer.enabled and key in self._get_normalized_lookup():
+            return self._get_normalized_lookup()[key]
+        
         # 2. 模式匹配 (关键词/品牌名识别)
         category = self._match_patterns(description)
         if category:
             return category
         
-        # 3. 改进的模糊匹配
-        close_matches = difflib.get_close_matches(
-            description, self.mapping.keys(), n=1, cutoff=0.6  # 降低阈值，提高匹配率
-        )
-        if close_matches:
-            mapping_value = self.mapping[close_matches[0]]
-            # Handle both old format (string) and new format (dict)
-            if isinstance(mapping_value, dict):
-                return mapping_value['category']
-            else:
-                return mapping_value
+        # 3. 模糊匹配 (按 matching.json 配置的阶段: difflib 或 token)
+        close_match = self.fuzzy_index.best_match(key)
+        if close_match is not None:
+            return self._get_normalized_lookup().get(close_match)
         
         return None
     
     def _match_patterns(self, description):
-        """基于模式匹配获取分类"""
-        description_upper = description.upper()
-        
-        # 检查用户定义的模式
-        for pattern, category in self.patterns.items():
-            if self._pattern_matches(pattern, description_upper):
-                return category
-        
-        # 内置智能模式匹配
-        built_in_category = self._built_in_pattern_match(description_upper)
-        if built_in_category:
-            return built_in_category
-        
-        return None
+        """基于模式匹配获取分类（用户模式优先，其次为内置智能模式）"""
+        return self.pattern_matcher.match(description.upper())
     
-    def _pattern_matches(self, pattern, description):
-        """检查模式是否匹配描述"""
-        # 支持不同类型的模式
-        if pattern.startswith('CONTAINS:'):
-            keyword = pattern[9:]  # 移除 "CONTAINS:" 前缀
-            return keyword in description
-        elif pattern.startswith('REGEX:'):
-            regex_pattern = pattern[6:]  # 移除 "REGEX:" 前缀
-            return bool(re.search(regex_pattern, description, re.IGNORECASE))
-        else:
-            # 默认为包含匹配
-            return pattern.upper() in description
-    
-    def _built_in_pattern_match(self, description):
-        """内置的智能模式匹配"""
-        # 常见超市/杂货店
-        grocery_keywords = ['WOOLWORTHS', 'COLES', 'IGA', 'ALDI', 'SUPERMARKET', 'GROCERIES']
-        if any(keyword in description for keyword in grocery_keywords):
-            return 'groceries'
-        
-        # 咖啡相关
-        coffee_keywords = ['COFFEE', 'STARBUCKS', 'CAFE', 'ESPRESSO', '咖啡']
-        if any(keyword in description for keyword in coffee_keywords):
-            return 'coffee'
-        
-        # 快餐
-        fastfood_keywords = ['MCDONALD', 'KFC', 'BURGER KING', 'SUBWAY', 'DOMINO', 'PIZZA', '麦当劳']
-        if any(keyword in description for keyword in fastfood_keywords):
-            return 'fast food'
-        
-        # 工资/收入
-        income_keywords = ['SALARY', 'WAGE', 'PAY', 'INCOME', 'DEPOSIT', 'TRANSFER IN']
-        if any(keyword in description for keyword in income_keywords):
-            return 'income'
-        
-        # 银行费用
-        bank_keywords = ['BANK FEE', 'ATM FEE', 'MONTHLY FEE', 'ACCOUNT FEE']
-        if any(keyword in description for keyword in bank_keywords):
-            return 'bank fees'
-        
-        # 交通
-        transport_keywords = ['UBER', 'TAXI', 'TRAIN', 'BUS', 'METRO', 'TRANSPORT', 'PETROL', 'FUEL']
-        if any(keyword in description for keyword in transport_keywords):
-            return 'transport'
-        
-        return None
+    def _compile_patterns(self, report_invalid=True):
+        """编译模式匹配器（正则只在加载或添加模式时编译一次）"""
+        matcher = PatternMatcher(self.patterns, BUILT_IN_PATTERNS, combine_regex=self.combine_regex)
+        if report_invalid:
+            for pattern, error in matcher.invalid_patterns:
+                print(f"Warning: Ignoring invalid pattern '{pattern}' in {self.patterns_file}: {error}")
+        return matcher
     
     def add_mapping(self, description, category, is_programmatic=False):
         """添加新的映射
@@ -238,22 +514,314 @@ class CategoryManager:
             category: 分类
             is_programmatic: 是否为程序自动添加（非用户交互）
         """
-        self.mapping[description] = {
-            'category': category,
-            'comment': 'UNCONFIRMED' if is_programmatic else ''
-        }
-        self.save_mapping()
+        self._store_mapping(description, category, 'UNCONFIRMED' if is_programmatic else '')
+        self._bump_version()
+        self._mapping_dirty = True
+        if self._batch_depth:
+            return
+        if self.journal:
+            self._append_journal({
+                'type': 'mapping',
+                'description': description,
+                'category': category,
+                'comment': self.mapping[description]['comment']
+            })
+        else:
+            self.flush()
+    
+    def add_mappings(self, mappings, is_programmatic=False):
+        """批量添加映射 {描述: 分类}，所有修改只写一次文件（日志模式下只追加一次）
+        
+        Args:
+            mappings: {描述: 分类} 字典
+            is_programmatic: 是否为程序自动添加（非用户交互）
+        """
+        if not mappings:
+            return
+        comment = 'UNCONFIRMED' if is_programmatic else ''
+        for description, category in mappings.items():
+            self._store_mapping(description, category, comment)
+        self._bump_version()
+        self._mapping_dirty = True
+        if self._batch_depth:
+            return
+        if self.journal:
+            self._append_journal(*(
+                {'type': 'mapping', 'description': description, 'category': category, 'comment': comment}
+                for description, category in mappings.items()
+            ))
+        else:
+            self.flush()
+    
+    def _store_mapping(self, description, category, comment):
+        """写入一条映射，并增量更新直接匹配的字典和模糊索引
+        
+        规范化后相同、分类也相同的旧描述是多余的，直接删除，映射不会因为日期、卡号等不同而增长。
+        分类不同的旧描述保留（原始描述仍然直接命中），这个规范化键有冲突，不再用于规范化后的直接匹配
+        （见 _build_normalized_index）。
+        """
+        key = self.normalizer.normalize(description)
+        if self.normalizer.enabled:
+            normalized_lookup, aliases = self._get_normalized_index()
+            category_lookup = self._get_category_lookup()
+            kept = []
+            for alias in aliases.get(key, []):
+                if alias == description:
+                    continue
+                if category_lookup[alias] == category:
+                    del self.mapping[alias]
+                    del category_lookup[alias]
+                else:
+                    kept.append(alias)
+            aliases[key] = kept + [description]
+            if kept:
+                normalized_lookup.pop(key, None)
+            else:
+                normalized_lookup[key] = category
+        
+        self.mapping[description] = {'category': category, 'comment': comment}
+        if self._category_lookup is not None:
+            self._category_lookup[description] = category
+        self.fuzzy_index.add(key)
     
     def add_pattern(self, pattern, category):
-        """添加新的模式映射"""
+        """添加新的模式映射
+        
+        Raises:
+            ValueError: REGEX: 模式不是有效的正则表达式
+        """
+        if pattern.startswith('REGEX:'):
+            try:
+                re.compile(pattern[6:])
+            except re.error as e:
+                raise ValueError(f"Invalid regex pattern '{pattern}': {e}")
+        
         self.patterns[pattern] = category
-        self.save_patterns()
+        self.pattern_matcher = self._compile_patterns(report_invalid=False)
+        self._bump_version()
+        self._patterns_dirty = True
+        if self._batch_depth:
+            return
+        if self.journal:
+            self._append_journal({'type': 'pattern', 'pattern': pattern, 'category': category})
+        else:
+            self.flush()
+    
+    @contextmanager
+    def batch(self):
+        """批量修改映射和模式，退出时只写一次文件
+        
+        用法:
+            with category_manager.batch():
+                for description, category in items:
+                    category_manager.add_mapping(description, category)
+        
+        可以嵌套，只有最外层退出时才写入。即使批量中途出错，已做的修改也会保存。
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+    
+    def flush(self):
+        """把尚未保存的映射和模式修改写入文件，日志随之失效并被删除"""
+        if self._mapping_dirty:
+            self.save_mapping()
+        if self._patterns_dirty:
+            self.save_patterns()
+        if self.journal_file.exists():
+            self.journal_file.unlink()
+    
+    def _bump_version(self):
+        """映射或模式变化后调用：使缓存的分类结果失效（直接匹配的字典由 _store_mapping 增量更新）"""
+        self.version += 1
+    
+    def _cache_lookup(self, description):
+        """查询分类缓存，返回 (是否命中, 分类)"""
+        if self._cache_version != self.version:
+            self._cache.clear()
+            self._cache_version = self.version
+        
+        try:
+            category = self._cache[description]
+        except (KeyError, TypeError):
+            self.cache_misses += 1
+            return False, None
+        
+        self._cache.move_to_end(description)
+        self.cache_hits += 1
+        return True, category
+    
+    def _cache_store(self, description, category):
+        """写入分类缓存，超出容量时淘汰最久未使用的条目"""
+        if not isinstance(description, str) or self.cache_size <= 0:
+            return
+        self._cache[description] = category
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def cache_stats(self):
+        """返回缓存命中统计，用于诊断"""
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+            'version': self.version,
+        }
+    
+    def content_hash(self):
+        """映射和模式内容的哈希，作为持久化缓存的键"""
+        content = json.dumps(
+            [CACHE_FORMAT_VERSION, self.mapping, self.patterns, self.normalizer.config_key(), self._fuzzy_config_key()],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
+    def load_cache(self):
+        """从持久化缓存文件加载分类结果，内容哈希不一致时忽略"""
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable category cache {self.cache_file}: {e}")
+            return
+        
+        if data.get('key') != self.content_hash():
+            return
+        
+        for description, category in data.get('entries', {}).items():
+            self._cache_store(description, category)
+    
+    def save_cache(self):
+        """把当前版本的分类结果保存到持久化缓存文件"""
+        if not self.cache_file:
+            return
+        
+        if self._cache_version != self.version:
+            self._cache.clear()
+            self._cache_version = self.version
+        
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.cache_file) as f:
+            json.dump({'key': self.content_hash(), 'entries': dict(self._cache)}, f, ensure_ascii=False)
     
     def apply_categories(self, df):
         """为DataFrame添加分类列"""
-        df['comment'] = df['description'].apply(self.get_category)
+        df['comment'] = self.categorize_series(df['description'])
         return df
     
+    def categorize_series(self, descriptions):
+        """批量分类：先对描述去重，逐级匹配唯一值后再广播回每一行"""
+        return _broadcast_categories(descriptions, self._categorize_unique)
+    
+    def _categorize_unique(self, uniques):
+        """对去重后的描述执行与 get_category 相同的匹配流程，返回分类数组"""
+        category_lookup = self._get_category_lookup()
+        normalized_lookup = self._get_normalized_lookup()
+        
+        # 1. 直接匹配（原始描述，然后是规范化的描述）
+        result, pending = _match_exact(uniques, category_lookup, self.normalizer, normalized_lookup)
+        
+        # 2. 分类缓存：之前算过的描述不再做模式和模糊匹配
+        cached = [self._cache_lookup(description) for description in pending]
+        cache_hits = np.array([hit for hit, _ in cached], dtype=bool)
+        result[pending.index[cache_hits]] = [category for hit, category in cached if hit]
+        pending = pending[~cache_hits]
+        
+        # 3-4. 模式匹配和模糊匹配
+        _match_rules(pending, uniques, result, self.pattern_matcher, self.fuzzy_index, normalized_lookup, self.normalizer)
+        
+        for position in pending.index:
+            self._cache_store(uniques[position], result[position])
+        
+        return result
+    
+    def snapshot(self):
+        """返回只读的分类快照（见 CategorySnapshot），可以发送到工作进程并行分类"""
+        cached = dict(self._cache) if self._cache_version == self.version else {}
+        return CategorySnapshot(self._get_category_lookup(), self.pattern_matcher, self.fuzzy_index, cached,
+                                self.normalizer, self._get_normalized_lookup())
+    
+    def _get_category_lookup(self):
+        """返回 描述->分类 的字典（用于批量直接匹配）"""
+        if self._category_lookup is None:
+            self._category_lookup = _category_lookup(self.mapping)
+        return self._category_lookup
+    
+    def _get_normalized_index(self):
+        """返回 (规范化描述->分类, 规范化描述->原始描述列表)，第一次使用时构建，之后增量更新
+        
+        规范化后相同、分类不同的描述是有冲突的键，不在规范化直接匹配中（原始描述完全相同时仍直接命中，
+        其他描述继续做模式匹配和模糊匹配）。结果只取决于映射内容，与写入顺序和映射文件的排列无关。
+        """
+        if self._normalized_index is None:
+            category_lookup = self._get_category_lookup()
+            self._normalized_index = self._build_normalized_index(category_lookup, self.match_keys(list(category_lookup)))
+        return self._normalized_index
+    
+    @staticmethod
+    def _build_normalized_index(category_lookup, keys):
+        """由 描述->分类 和对应的规范化键构建 (规范化描述->分类, 规范化描述->原始描述列表)"""
+        normalized_lookup = {}
+        aliases = defaultdict(list)
+        conflicts = set()
+        for description, key in zip(category_lookup, keys):
+            category = category_lookup[description]
+            if normalized_lookup.setdefault(key, category) != category:
+                conflicts.add(key)
+            aliases[key].append(description)
+        for key in conflicts:
+            del normalized_lookup[key]
+        return normalized_lookup, aliases
+    
+    def _get_normalized_lookup(self):
+        """返回 规范化描述->分类 的字典；未启用规范化时就是直接映射"""
+        if not self.normalizer.enabled:
+            return self._get_category_lookup()
+        return self._get_normalized_index()[0]
+    
+    def match_keys(self, descriptions):
+        """返回描述用于匹配的键（规范化后的描述），接受列表或Series"""
+        if not self.normalizer.enabled:
+            return descriptions
+        if isinstance(descriptions, pd.Series):
+            return self.normalizer.normalize_series(descriptions)
+        return [self.normalizer.normalize(description) for description in descriptions]
+    
+    def merge_normalized_duplicates(self):
+        """删除规范化后重复、分类相同的映射（保留映射中先出现的描述），返回删除的数量
+        
+        规范化后相同但分类不同的描述保留不动。
+        """
+        if not self.normalizer.enabled:
+            return 0
+        category_lookup = self._get_category_lookup()
+        _, aliases = self._get_normalized_index()
+        removed = 0
+        for key, descriptions in aliases.items():
+            if len(descriptions) > 1 and len({category_lookup[description] for description in descriptions}) == 1:
+                for description in descriptions[1:]:
+                    del self.mapping[description]
+                    del category_lookup[description]
+                    removed += 1
+                aliases[key] = descriptions[:1]
+        if removed:
+            self._bump_version()
+            self._mapping_dirty = True
+            if not self._batch_depth:
+                self.flush()
+        return removed
+    
+    def get_categories(self):
+        """返回映射中出现过的所有分类"""
+        return set(self._get_category_lookup().values())
+    
     def get_unmapped_descriptions(self, df):
         """获取未分类的描述"""
         return df[df['comment'].isna()]['description'].unique().tolist()
@@ -279,9 +847,20 @@ class CategoryManager:
         
         return suggestions
     
+    def get_exact_matches(self, descriptions):
+        """批量获取精确匹配的分类（向量化，原始描述或规范化的描述），没有映射的描述为 NaN"""
+        exact = descriptions.map(self._get_category_lookup())
+        if self.normalizer.enabled:
+            missing = exact.isna() & descriptions.map(lambda value: isinstance(value, str)).astype(bool)
+            if missing.any():
+                exact[missing] = self.match_keys(descriptions[missing]).map(self._get_normalized_lookup())
+        return exact
+    
     def get_exact_match(self, description):
-        """获取精确匹配的分类，用于学习模式"""
+        """获取精确匹配的分类（原始描述或规范化的描述），用于学习模式"""
         mapping_value = self.mapping.get(description)
+        if mapping_value is None and self.normalizer.enabled and isinstance(description, str):
+            return self._get_normalized_lookup().get(self.normalizer.normalize(description))
         if isinstance(mapping_value, dict):
             return mapping_value['category']
         else:
@@ -1,13 +1,99 @@
 import pandas as pd
+import numpy as np
+import copy
+import csv
+import heapq
 import json
-from datetime import datetime
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from .file_utils import atomic_open
+    from .bank_parser import get_parser
+except ImportError:
+    # For when running tests or standalone
+    from file_utils import atomic_open
+    from bank_parser import get_parser
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.feather
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 文件处理逻辑变化时修改此版本号，使增量缓存中的处理结果失效
+INGEST_CACHE_VERSION = 4
+
+# 月度输出文件的列顺序
+OUTPUT_COLUMNS = ['date', 'description', 'amount', 'category', 'bank', 'comment']
+
+# 输出格式 -> 文件扩展名；parquet 和 feather 需要 pyarrow
+OUTPUT_FORMATS = {'csv': 'csv', 'parquet': 'parquet', 'feather': 'feather'}
+
+# 列式输出的固定schema：所有月份（数据集的所有分区）类型一致。
+# 分类用 int32 索引的字典，否则 pandas 按每个月的分类数量选择 int8/int16 索引，分区之间无法合并读取
+OUTPUT_SCHEMA = pyarrow.schema([
+    ('date', pyarrow.timestamp('ns')),
+    ('description', pyarrow.string()),
+    ('amount', pyarrow.float64()),
+    ('category', pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+    ('bank', pyarrow.string()),
+    ('comment', pyarrow.string()),
+]) if PYARROW_AVAILABLE else None
+
+# 流式模式归并时同时打开的有序段文件数上限，段更多时分多轮归并，不会超出进程的打开文件数限制
+MERGE_FAN_IN = 64
+
+# 流式模式中间文件里缺失日期的排序键，排在所有日期之后（与 sort_values 的 na_position='last' 一致）
+_NAT_SORT_KEY = np.iinfo(np.int64).max
+_EPOCH = datetime(1970, 1, 1)
+
+# bank_config 中没有 date_format 时依次尝试的日期格式
+DATE_FORMAT_CANDIDATES = [
+    '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d/%m/%y', '%d-%m-%Y', '%Y/%m/%d',
+    '%d %b %Y', '%d-%b-%Y', '%d %B %Y', '%Y%m%d',
+    '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+]
+
+# 进程池工作进程中的处理器副本（只有银行配置和已识别的日期格式），由 _init_ingest_worker 在进程启动时设置一次
+_ingest_processor = None
+
+def _init_ingest_worker(processor):
+    global _ingest_processor
+    _ingest_processor = processor
+
+def _load_file_in_worker(file_path):
+    """在工作进程中加载一个文件，连同识别出的日期格式和解析耗时一起返回
+
+    工作进程对处理器的修改不会传回主进程，所以由主进程合并这些记录。
+    """
+    _ingest_processor.date_parse_timings = []
+    df = _ingest_processor.load_and_process_file(file_path)
+    return df, _ingest_processor.date_formats, _ingest_processor.date_parse_timings
 
 class DataProcessor:
-    def __init__(self, config_path="config/bank_config.json"):
+    def __init__(self, config_path="config/bank_config.json", cache_dir=None):
         with open(config_path) as f:
             self.bank_config = json.load(f)
+        
+        # 增量处理：记录每个输入文件的大小、mtime、内容哈希和处理结果
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.manifest = self._load_manifest()
+        self.input_hashes = {}
+        
+        # 日期解析：自动识别出的每家银行的日期格式，以及每次解析的耗时记录
+        self.date_formats = {}
+        self.date_parse_timings = []
     
     def parse_filename(self, filename):
         """解析文件名获取月份和银行名"""
@@ -29,21 +115,16 @@ class DataProcessor:
         """加载并处理单个银行文件"""
         filename = Path(file_path).name
         month, bank_code = self.parse_filename(filename)
+        bank_info = self.bank_config.get(bank_code, {})
         
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
-        
-        # 标准化列名
-        df.columns = df.columns.str.lower()
-        required_cols = ['date', 'description', 'amount']
-        
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError(f"Missing required columns in {filename}")
-        
+        # 按银行解析器和读取规格只读取需要的列，并固定列类型
+        df = self._read_csv(file_path, bank_info, self.get_parser(bank_code, bank_info))
+        return self._process_frame(df, bank_info, bank_code, month)
+    
+    def _process_frame(self, df, bank_info, bank_code, month):
+        """标准化一个已读取的数据块：解析日期、处理金额符号、添加银行和月份"""
         # 处理日期
-        bank_info = self.bank_config.get(bank_code, {})
-        date_format = bank_info.get('date_format', '%Y-%m-%d')
-        df['date'] = pd.to_datetime(df['date'], format=date_format)
+        df['date'] = self.parse_dates(df['date'], bank_code, bank_info, month)
         
         # 处理金额符号
         if bank_info.get('revert_amount', False):
@@ -54,65 +135,761 @@ class DataProcessor:
         df['month'] = month
         
         return df[['date', 'description', 'amount', 'bank', 'month']]
-
-    def merge_files(self, input_dir="data/input"):
-        """合并所有银行文件"""
+    
+    def parse_dates(self, dates, bank_code, bank_info, month=None):
+        """把日期字符串列解析为 datetime64
+        
+        账单中的日期重复很多（每个月文件只有约30个不同的值），因此只解析唯一值，
+        再按编码映射回每一行。bank_config 中没有 date_format 时自动识别格式并按银行缓存。
+        每次调用的行数、唯一值数量、格式和耗时记录在 date_parse_timings 中。
+        """
+        start = time.perf_counter()
+        codes, uniques = pd.factorize(dates)
+        uniques = pd.Series(uniques, dtype=object)
+        
+        date_format = bank_info.get('date_format')
+        if date_format is not None:
+            parsed = pd.to_datetime(uniques, format=date_format)
+        elif not len(uniques):
+            # 没有日期可供识别，也不缓存格式
+            parsed = pd.to_datetime(uniques)
+        else:
+            date_format = self.date_formats.get(bank_code)
+            try:
+                parsed = pd.to_datetime(uniques, format=date_format) if date_format else None
+            except ValueError:
+                # 缓存的格式不适用于这个文件，重新识别
+                parsed = None
+            if parsed is None:
+                date_format, parsed = self._detect_date_format(uniques, bank_code, month)
+                self.date_formats[bank_code] = date_format
+        
+        # 末尾追加 NaT，编码 -1（缺失值）取到它
+        values = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+        result = pd.Series(values[codes], index=dates.index, name=dates.name)
+        
+        self.date_parse_timings.append({
+            'bank': bank_code,
+            'format': date_format,
+            'rows': len(dates),
+            'unique': len(uniques),
+            'seconds': time.perf_counter() - start,
+        })
+        return result
+    
+    def _detect_date_format(self, uniques, bank_code, month=None):
+        """从候选格式中选出能解析全部日期的格式
+        
+        有多个格式都能解析时（例如日期都不超过12号，日/月顺序有歧义），
+        选择解析结果落在文件月份内最多的格式；仍然相同时按候选顺序。
+        """
+        best = None
+        for order, date_format in enumerate(DATE_FORMAT_CANDIDATES):
+            try:
+                parsed = pd.to_datetime(uniques, format=date_format)
+            except (ValueError, TypeError):
+                continue
+            in_month = 0
+            if month is not None and len(parsed):
+                in_month = int((parsed.dt.strftime('%Y-%m') == month).sum())
+            score = (in_month, -order)
+            if best is None or score > best[0]:
+                best = (score, date_format, parsed)
+        
+        if best is None:
+            raise ValueError(
+                f"Could not detect the date format for bank '{bank_code}'. "
+                f"Please set date_format in bank_config.json"
+            )
+        return best[1], best[2]
+    
+    def date_parse_stats(self):
+        """按银行汇总日期解析的行数、唯一值数量和耗时"""
+        stats = {}
+        for timing in self.date_parse_timings:
+            bank_stats = stats.setdefault(timing['bank'], {'format': timing['format'], 'rows': 0, 'unique': 0, 'seconds': 0.0})
+            bank_stats['format'] = timing['format']
+            bank_stats['rows'] += timing['rows']
+            bank_stats['unique'] += timing['unique']
+            bank_stats['seconds'] += timing['seconds']
+        return stats
+    
+    def get_parser(self, bank_code, bank_info=None):
+        """返回银行的解析器：bank_config 中的 "parser" 配置优先，其次按银行代码查找已注册的解析器"""
+        if bank_info is None:
+            bank_info = self.bank_config.get(bank_code, {})
+        return get_parser(bank_code, bank_info.get('parser'))
+    
+    def _read_spec(self, file_path, bank_info, parser=None):
+        """根据表头、银行解析器和 bank_config 中的 "read" 配置生成 pd.read_csv 的参数
+        
+        支持的配置项（均为可选）:
+            usecols: 要读取的原始列名，默认只读取解析器需要的列（不区分大小写）
+            dtype: 列类型，键可以是原始列名或标准列名
+            description_dtype: 设为 "category" 时描述列使用分类类型，适合商户重复很多的大文件
+            engine: 设为 "pyarrow" 时在已安装 pyarrow 的情况下使用 pyarrow 解析器
+        """
+        filename = Path(file_path).name
+        if parser is None:
+            _, bank_code = self.parse_filename(filename)
+            parser = self.get_parser(bank_code, bank_info)
+        read_config = bank_info.get('read', {})
+        header = pd.read_csv(file_path, nrows=0).columns
+        
+        read_kwargs = parser.read_spec(header, read_config, filename)
+        if read_config.get('engine') == 'pyarrow' and PYARROW_AVAILABLE:
+            read_kwargs['engine'] = 'pyarrow'
+        return read_kwargs
+    
+    def _read_csv(self, file_path, bank_info, parser):
+        """读取CSV文件并用银行解析器映射为 date/description/amount"""
+        df = pd.read_csv(file_path, **self._read_spec(file_path, bank_info, parser))
+        return parser.normalize(df, Path(file_path).name)
+    
+    def _read_csv_chunks(self, file_path, bank_info, parser, chunksize):
+        """分块读取CSV文件，每块最多 chunksize 行，并用银行解析器映射列"""
+        read_kwargs = self._read_spec(file_path, bank_info, parser)
+        # pyarrow 解析器不支持分块读取
+        read_kwargs.pop('engine', None)
+        with pd.read_csv(file_path, chunksize=chunksize, **read_kwargs) as reader:
+            for df in reader:
+                yield parser.normalize(df, Path(file_path).name)
+    
+    def merge_files(self, input_dir="data/input", workers=1, pool="thread", months=None):
+        """合并所有银行文件，按月分组
+        
+        每个文件的月份在文件名中已知，因此读取时直接把文件放进所属月份，
+        再在每个月份内按日期稳定排序，不再对全部历史做一次全局排序和 groupby。
+        结果与全局稳定排序后分组相同：{YYYYMM: 按日期排序、索引从0开始的DataFrame}，按月份排列。
+        
+        Args:
+            input_dir: 输入目录
+            workers: 并行读取文件的工作线程/进程数，1 表示逐个读取
+            pool: 并行方式，"thread" 或 "process"
+            months: 只加载这些月份 (YYYYMM)，在读取CSV之前按文件名筛选
+        """
         input_path = Path(input_dir)
-        all_data = []
+        month_frames = {}
+        processed = 0
         
         # Process CSV files only
-        for file_path in input_path.glob("*.csv"):
+        file_paths = list(input_path.glob("*.csv"))
+        if months is not None:
+            file_paths = self._filter_files_by_month(file_paths, months)
+        
+        self.input_hashes = {}
+        if self.cache_dir is not None:
+            self._prune_manifest()
+            results = self._load_files_incremental(file_paths, workers, pool)
+        else:
+            results = ((file_path, df, error, False) for file_path, df, error in self._load_files(file_paths, workers, pool))
+        
+        for file_path, df, error, cached in results:
+            if error is not None:
+                print(f"Error processing {file_path.name}: {error}")
+            else:
+                processed += 1
+                if len(df):
+                    # 转换月份格式从 YYYY-MM 到 YYYYMM
+                    month, _ = self.parse_filename(file_path.name)
+                    month_frames.setdefault(month.replace('-', ''), []).append(df)
+                print(f"Processed: {file_path.name}" + (" (unchanged, cached)" if cached else ""))
+        
+        if not processed:
+            raise ValueError("No valid CSV files found to process")
+        
+        # 各月份互不相关，只在月份内合并和排序
+        return {month_key: self._merge_month(month_frames[month_key]) for month_key in sorted(month_frames)}
+    
+    @staticmethod
+    def _merge_month(frames):
+        """合并一个月份的文件并按日期稳定排序
+        
+        同一日期的交易保持文件和行的原始顺序（流式模式依赖这一点得到相同的输出）。
+        """
+        month_df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        return month_df.sort_values('date', kind='stable', ignore_index=True)
+    
+    def _filter_files_by_month(self, file_paths, months):
+        """按文件名中的月份筛选文件；文件名无效的文件保留，由加载时报告错误"""
+        months = set(months)
+        selected = []
+        for file_path in file_paths:
             try:
-                df = self.load_and_process_file(str(file_path))
-                all_data.append(df)
-                print(f"Processed: {file_path.name}")
-            except Exception as e:
+                month, _ = self.parse_filename(file_path.name)
+            except ValueError:
+                selected.append(file_path)
+                continue
+            if month.replace('-', '') in months:
+                selected.append(file_path)
+        return selected
+    
+    def available_months(self, input_dir="data/input"):
+        """只根据文件名返回可用月份 (YYYYMM) 列表"""
+        months = set()
+        for file_path in Path(input_dir).glob("*.csv"):
+            try:
+                month, _ = self.parse_filename(file_path.name)
+            except ValueError:
+                continue
+            months.add(month.replace('-', ''))
+        return sorted(months)
+    
+    def list_months(self, input_dir="data/input"):
+        """只根据文件名和行数列出可用月份，不解析CSV内容
+        
+        Returns:
+            {YYYYMM: {'transactions': 行数, 'banks': [银行名称, ...]}}，按月份排序
+        """
+        months = {}
+        for file_path in Path(input_dir).glob("*.csv"):
+            try:
+                month, bank_code = self.parse_filename(file_path.name)
+                row_count = self._cached_row_count(file_path)
+                if row_count is None:
+                    row_count = self._count_rows(file_path)
+            except (ValueError, OSError) as e:
                 print(f"Error processing {file_path.name}: {e}")
+                continue
+            
+            info = months.setdefault(month.replace('-', ''), {'transactions': 0, 'banks': []})
+            info['transactions'] += row_count
+            bank_name = self.bank_config.get(bank_code, {}).get('name', bank_code.upper())
+            if bank_name not in info['banks']:
+                info['banks'].append(bank_name)
         
-        if not all_data:
-            raise ValueError("No valid CSV files found to process")
+        return dict(sorted(months.items()))
+    
+    def _cached_row_count(self, file_path):
+        """文件自上次处理后未修改时，从增量处理清单中取行数"""
+        entry = self.manifest['files'].get(str(Path(file_path).resolve()))
+        if entry is None:
+            return None
+        stat = Path(file_path).stat()
+        if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+            return None
+        return entry['rows']
+    
+    @staticmethod
+    def _count_rows(file_path):
+        """粗略统计CSV数据行数（非空行数减去表头）"""
+        with open(file_path, 'rb') as f:
+            line_count = sum(1 for line in f if line.strip())
+        return max(line_count - 1, 0)
+    
+    def _load_manifest(self):
+        """加载增量处理清单"""
+        empty = {'version': INGEST_CACHE_VERSION, 'files': {}, 'outputs': {}}
+        if self.cache_dir is None:
+            return empty
+        
+        manifest_file = self.cache_dir / 'manifest.json'
+        if not manifest_file.exists():
+            return empty
+        try:
+            with open(manifest_file, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable ingest manifest {manifest_file}: {e}")
+            return empty
+        
+        if manifest.get('version') != INGEST_CACHE_VERSION:
+            return empty
+        return manifest
+    
+    def _prune_manifest(self):
+        """删除清单中已不存在的输入文件、它们缓存的处理结果和已不存在的输出，缓存不会无限增长
+        
+        同时删除清单中没有记录的处理结果文件（例如缓存版本变化后留下的旧文件）。
+        """
+        for key in [key for key in self.manifest['files'] if not Path(key).exists()]:
+            entry = self.manifest['files'].pop(key)
+            (self.cache_dir / entry['cache']).unlink(missing_ok=True)
+        for key in [key for key in self.manifest['outputs'] if not Path(key).exists()]:
+            del self.manifest['outputs'][key]
+        
+        referenced = {entry['cache'] for entry in self.manifest['files'].values()}
+        files_dir = self.cache_dir / 'files'
+        if files_dir.exists():
+            for cache_file in files_dir.glob('*.pkl'):
+                if f"files/{cache_file.name}" not in referenced:
+                    cache_file.unlink()
+    
+    def _save_manifest(self):
+        """原子写入增量处理清单"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.cache_dir / 'manifest.json') as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+    
+    @staticmethod
+    def _file_hash(file_path):
+        """计算文件内容的sha256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _config_hash(self, file_path):
+        """文件所属银行配置的哈希，配置变化时缓存的处理结果失效"""
+        try:
+            _, bank_code = self.parse_filename(Path(file_path).name)
+        except ValueError:
+            bank_code = None
+        bank_info = self.bank_config.get(bank_code, {})
+        return hashlib.sha256(json.dumps(bank_info, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _record_input_hash(self, file_path, file_hash):
+        """记录输入文件的内容哈希和所属银行配置的哈希，用于计算月份指纹
+        
+        银行配置（金额符号、日期格式、解析器等）变化时文件会重新解析，月份输出也必须重新写入。
+        """
+        try:
+            month, _ = self.parse_filename(Path(file_path).name)
+        except ValueError:
+            return
+        self.input_hashes.setdefault(month.replace('-', ''), {})[Path(file_path).name] = [
+            file_hash, self._config_hash(file_path)
+        ]
+    
+    def _load_cached_file(self, file_path):
+        """如果文件自上次处理后没有变化，返回缓存的处理结果，否则返回None"""
+        key = str(Path(file_path).resolve())
+        entry = self.manifest['files'].get(key)
+        if entry is None or entry.get('config') != self._config_hash(file_path):
+            return None
+        
+        cache_file = self.cache_dir / entry['cache']
+        if not cache_file.exists():
+            return None
+        
+        stat = Path(file_path).stat()
+        if stat.st_size != entry['size']:
+            return None
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            # mtime变了，内容可能没变（例如重新复制了同一份文件）
+            if self._file_hash(file_path) != entry['sha256']:
+                return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+        
+        try:
+            df = pd.read_pickle(cache_file)
+        except Exception:
+            return None
+        
+        self._record_input_hash(file_path, entry['sha256'])
+        return df
+    
+    def _store_cached_file(self, file_path, df):
+        """保存文件的处理结果并更新清单"""
+        key = str(Path(file_path).resolve())
+        cache_name = f"files/{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pkl"
+        cache_file = self.cache_dir / cache_name
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # pickle 原样保留列类型（日期、分类等），读取比重新解析CSV快得多
+        with atomic_open(cache_file, 'wb') as f:
+            df.to_pickle(f)
         
-        # 合并并排序
-        merged_df = pd.concat(all_data, ignore_index=True)
-        merged_df = merged_df.sort_values('date').reset_index(drop=True)
+        stat = Path(file_path).stat()
+        file_hash = self._file_hash(file_path)
+        self.manifest['files'][key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_hash,
+            'config': self._config_hash(file_path),
+            'rows': len(df),
+            'cache': cache_name,
+        }
+        self._record_input_hash(file_path, file_hash)
+    
+    def _load_files_incremental(self, file_paths, workers=1, pool="thread"):
+        """只重新解析有变化的文件，按输入顺序返回 (文件路径, DataFrame, 错误, 是否来自缓存)"""
+        cached = {}
+        for file_path in file_paths:
+            df = self._load_cached_file(file_path)
+            if df is not None:
+                cached[file_path] = df
         
-        # 按月份分组
-        monthly_data = {}
-        for month, group in merged_df.groupby('month'):
-            # 转换月份格式从 YYYY-MM 到 YYYYMM
-            month_key = month.replace('-', '')
-            monthly_data[month_key] = group.reset_index(drop=True)
+        changed = [file_path for file_path in file_paths if file_path not in cached]
+        parsed = {}
+        for file_path, df, error in self._load_files(changed, workers, pool):
+            parsed[file_path] = (df, error)
+            if error is None:
+                self._store_cached_file(file_path, df)
+        self._save_manifest()
         
-        return monthly_data
+        for file_path in file_paths:
+            if file_path in cached:
+                yield file_path, cached[file_path], None, True
+            else:
+                df, error = parsed[file_path]
+                yield file_path, df, error, False
     
-    def save_monthly_files(self, monthly_data, output_dir="data/output"):
-        """保存按月分组的数据到单独文件"""
+    def month_fingerprint(self, month, extra=''):
+        """月份输出的指纹：该月所有输入文件的内容哈希和银行配置哈希，加上额外信息（如映射和模式的哈希）
+        
+        只有启用增量处理并调用过 merge_files 后才有输入哈希，否则返回None。
+        """
+        inputs = self.input_hashes.get(month)
+        if not inputs:
+            return None
+        content = json.dumps([INGEST_CACHE_VERSION, sorted(inputs.items()), extra])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
+    def _load_files(self, file_paths, workers=1, pool="thread"):
+        """加载多个文件，按输入顺序逐个返回 (文件路径, DataFrame, 错误)"""
+        if workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                try:
+                    yield file_path, self.load_and_process_file(str(file_path)), None
+                except Exception as e:
+                    yield file_path, None, e
+            return
+        
+        if pool == "process":
+            # 每个工作进程启动时收到一份精简的处理器副本，之后每个任务只传输文件路径
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_ingest_worker,
+                                           initargs=(self._worker_copy(),))
+            load_file = _load_file_in_worker
+        elif pool == "thread":
+            executor = ThreadPoolExecutor(max_workers=workers)
+            load_file = self.load_and_process_file
+        else:
+            raise ValueError(f"Unknown pool type: {pool}. Expected 'thread' or 'process'")
+        
+        with executor:
+            futures = [executor.submit(load_file, str(file_path)) for file_path in file_paths]
+            # 按提交顺序收集结果，保证输出和合并顺序与逐个读取时相同
+            for file_path, future in zip(file_paths, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield file_path, None, e
+                    continue
+                if pool == "process":
+                    result, date_formats, timings = result
+                    self.date_formats.update(date_formats)
+                    self.date_parse_timings.extend(timings)
+                yield file_path, result, None
+    
+    def _worker_copy(self):
+        """进程池使用的处理器副本：不带增量清单和输入哈希，减少传给工作进程的数据"""
+        worker = copy.copy(self)
+        worker.manifest = None
+        worker.input_hashes = {}
+        worker.date_formats = dict(self.date_formats)
+        worker.date_parse_timings = []
+        return worker
+    
+    def save_monthly_files(self, monthly_data, output_dir="data/output", fingerprints=None, output_format="csv",
+                           write_workers=1):
+        """保存按月分组的数据到单独文件
+        
+        Args:
+            monthly_data: {月份: DataFrame}，也可以是逐个产生 (月份, DataFrame) 的迭代器——
+                每个月份一产生就开始写出，不必等所有月份都处理完
+            fingerprints: 可选的 {月份: 指纹}（见 month_fingerprint）。启用增量处理时，
+                指纹与上次写入时相同且输出文件仍存在的月份会被跳过
+            output_format: "csv"、"parquet" 或 "feather"。列式格式保留日期、金额和分类的类型，
+                读取时无需重新解析
+            write_workers: 同时写文件的I/O线程数，1 表示逐个写入
+        """
+        extension = self._check_output_format(output_format)
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
+        fingerprints = fingerprints or {}
+        
+        def pending():
+            items = monthly_data.items() if hasattr(monthly_data, 'items') else monthly_data
+            for month, df in items:
+                file_path = output_path / f"{month}.{extension}"
+                if self._is_output_unchanged(file_path, fingerprints.get(month)):
+                    print(f"Skipped unchanged month: {file_path.name}")
+                    continue
+                yield month, file_path, df
         
         saved_files = []
+        for month, file_path, rows in self._write_months(pending(), output_format, write_workers):
+            saved_files.append(str(file_path))
+            print(f"Saved {rows} transactions to: {file_path.name}")
+            self._record_output(file_path, fingerprints.get(month))
+        
+        if self.cache_dir is not None and fingerprints:
+            self._save_manifest()
+        
+        return saved_files
+    
+    def save_dataset(self, monthly_data, dataset_dir="data/dataset", fingerprints=None, output_format="parquet",
+                     write_workers=1):
+        """把全部历史保存为按月分区的列式数据集：<dataset_dir>/month=YYYYMM/part-0.<格式>
+        
+        每个月份是一个独立的分区文件，重新处理某个月只替换该月的分区；
+        用 load_dataset 可以一次读取多个月份。
+        """
+        if output_format == 'csv':
+            raise ValueError("The consolidated dataset must use a columnar format (parquet or feather)")
+        extension = self._check_output_format(output_format)
+        dataset_path = Path(dataset_dir)
+        fingerprints = fingerprints or {}
+        
+        pending = []
         for month, df in monthly_data.items():
-            # 重新排序列：date, description, amount, category, bank, comment
-            df_output = df.copy()
-            
-            # 确保comment列存在并重命名为category
-            if 'comment' not in df_output.columns:
-                df_output['comment'] = ''
-            
-            # 重命名comment列为category
-            df_output = df_output.rename(columns={'comment': 'category'})
-            
-            # 添加新的comment列（空白）
-            df_output['comment'] = ''
-            
-            # 重新排序列：date, description, amount, category, bank, comment
-            column_order = ['date', 'description', 'amount', 'category', 'bank', 'comment']
-            df_output = df_output[column_order]
-            
-            filename = f"{month}.csv"
-            file_path = output_path / filename
-            df_output.to_csv(file_path, index=False)
+            partition_path = dataset_path / f"month={month}"
+            partition_path.mkdir(parents=True, exist_ok=True)
+            file_path = partition_path / f"part-0.{extension}"
+            if not self._is_output_unchanged(file_path, fingerprints.get(month)):
+                pending.append((month, file_path, df))
+        
+        saved_files = []
+        for month, file_path, _ in self._write_months(pending, output_format, write_workers):
             saved_files.append(str(file_path))
-            print(f"Saved {len(df_output)} transactions to: {filename}")
+            self._record_output(file_path, fingerprints.get(month))
+        
+        print(f"Saved {len(saved_files)} month partitions to dataset: {dataset_path}")
+        if self.cache_dir is not None and fingerprints:
+            self._save_manifest()
         
         return saved_files
+    
+    @staticmethod
+    def load_dataset(dataset_dir="data/dataset", months=None, output_format="parquet"):
+        """读取 save_dataset 写出的数据集，返回带 month 列 (YYYYMM) 的 DataFrame
+        
+        Args:
+            months: 只读取这些月份，其他分区的文件不会被打开
+        """
+        DataProcessor._check_output_format(output_format)
+        partitioning = pyarrow.dataset.partitioning(pyarrow.schema([('month', pyarrow.string())]), flavor='hive')
+        dataset = pyarrow.dataset.dataset(
+            dataset_dir, format='ipc' if output_format == 'feather' else 'parquet', partitioning=partitioning
+        )
+        month_filter = None
+        if months is not None:
+            month_filter = pyarrow.dataset.field('month').isin([str(month) for month in months])
+        return dataset.to_table(filter=month_filter).to_pandas()
+    
+    @staticmethod
+    def _check_output_format(output_format):
+        """检查输出格式，返回文件扩展名"""
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}. Expected one of {', '.join(OUTPUT_FORMATS)}")
+        if output_format != 'csv' and not PYARROW_AVAILABLE:
+            raise ValueError(f"{output_format} output requires pyarrow (pip install pyarrow)")
+        return OUTPUT_FORMATS[output_format]
+    
+    def _is_output_unchanged(self, file_path, fingerprint):
+        """增量处理时，指纹与上次写入时相同且文件仍存在的输出无需重写"""
+        return (self.cache_dir is not None and fingerprint is not None and file_path.exists() and
+                self.manifest['outputs'].get(str(file_path.resolve())) == fingerprint)
+    
+    def _record_output(self, file_path, fingerprint):
+        if self.cache_dir is not None and fingerprint is not None:
+            self.manifest['outputs'][str(file_path.resolve())] = fingerprint
+    
+    def _write_months(self, pending, output_format, write_workers=1):
+        """写出 (月份, 文件路径, DataFrame) 序列，按输入顺序返回 (月份, 文件路径, 行数)
+        
+        pending 可以是迭代器，每个月份到达后立即写出（或提交给线程池）。
+        write_workers > 1 时在I/O线程池中同时写多个月份；每个线程只持有该月的列投影，
+        不会复制数据，因此并发写入不会成倍增加内存。
+        """
+        def write(file_path, df):
+            self._write_output(self._output_frame(df), file_path, output_format)
+            return len(df)
+        
+        if write_workers <= 1:
+            for month, file_path, df in pending:
+                yield month, file_path, write(file_path, df)
+            return
+        
+        with ThreadPoolExecutor(max_workers=write_workers) as executor:
+            submitted = [(month, file_path, executor.submit(write, file_path, df)) for month, file_path, df in pending]
+            # 按提交顺序收集结果，输出信息和清单记录与逐个写入时相同
+            for month, file_path, future in submitted:
+                yield month, file_path, future.result()
+    
+    @staticmethod
+    def _write_output(df_output, file_path, output_format):
+        """按格式写出一个月的输出"""
+        if output_format == 'csv':
+            df_output.to_csv(file_path, index=False)
+            return
+        
+        # 列式格式保留类型：日期为 datetime64，金额为 float64，分类为 category（见 OUTPUT_SCHEMA）
+        table = pyarrow.Table.from_pandas(df_output, schema=OUTPUT_SCHEMA, preserve_index=False)
+        with atomic_open(file_path, 'wb') as f:
+            if output_format == 'parquet':
+                pyarrow.parquet.write_table(table, f)
+            else:
+                pyarrow.feather.write_feather(table, f)
+    
+    def stream_monthly_files(self, category_manager, input_dir="data/input", output_dir="data/output",
+                             chunksize=100000, months=None, merge_fan_in=MERGE_FAN_IN):
+        """流式处理：分块读取、分类并写出月度文件，内存占用只与块大小有关
+        
+        每个数据块读取后立即分类，按日期稳定排序后写入所属月份的临时有序段文件；
+        所有输入读完后，每个月份的有序段做k路归并（每轮最多同时打开 merge_fan_in 个段），写出最终的月度文件。
+        输出与 merge_files + apply_categories + save_monthly_files 逐字节相同。
+        不支持交互式分类和增量跳过。
+        
+        Returns:
+            (保存的文件列表, {月份: 交易数})
+        """
+        input_path = Path(input_dir)
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        file_paths = list(input_path.glob("*.csv"))
+        if months is not None:
+            file_paths = self._filter_files_by_month(file_paths, months)
+        
+        runs = {}
+        run_count = 0
+        date_flags = {}
+        row_counts = {}
+        with tempfile.TemporaryDirectory(dir=output_path, prefix='.stream-') as run_dir:
+            for file_path in file_paths:
+                file_runs = []
+                try:
+                    month, bank_code = self.parse_filename(file_path.name)
+                    bank_info = self.bank_config.get(bank_code, {})
+                    parser = self.get_parser(bank_code, bank_info)
+                    month_key = month.replace('-', '')
+                    flags = {'dates_only': True, 'ms': False, 'us': False, 'ns': False}
+                    rows = 0
+                    for chunk in self._read_csv_chunks(file_path, bank_info, parser, chunksize):
+                        df = self._process_frame(chunk, bank_info, bank_code, month)
+                        df = category_manager.apply_categories(df)
+                        run_path = Path(run_dir) / f"run-{run_count:06d}.csv"
+                        run_count += 1
+                        self._write_run(df, run_path, flags)
+                        file_runs.append(run_path)
+                        rows += len(df)
+                except Exception as e:
+                    # 与 merge_files 一致：出错的文件整体跳过
+                    for run_path in file_runs:
+                        run_path.unlink()
+                    print(f"Error processing {file_path.name}: {e}")
+                    continue
+                
+                runs.setdefault(month_key, []).extend(file_runs)
+                month_flags = date_flags.setdefault(month_key, {'dates_only': True, 'ms': False, 'us': False, 'ns': False})
+                month_flags['dates_only'] &= flags['dates_only']
+                for unit in ('ms', 'us', 'ns'):
+                    month_flags[unit] |= flags[unit]
+                row_counts[month_key] = row_counts.get(month_key, 0) + rows
+                print(f"Processed: {file_path.name}")
+            
+            if not runs:
+                raise ValueError("No valid CSV files found to process")
+            
+            saved_files = []
+            for month_key in sorted(runs):
+                filename = f"{month_key}.csv"
+                file_path = output_path / filename
+                self._merge_runs(runs[month_key], file_path, date_flags[month_key], merge_fan_in)
+                saved_files.append(str(file_path))
+                print(f"Saved {row_counts[month_key]} transactions to: {filename}")
+        
+        return saved_files, {month_key: row_counts[month_key] for month_key in sorted(row_counts)}
+    
+    def _write_run(self, df, run_path, flags):
+        """把一个已分类的数据块按日期稳定排序后写成有序段文件
+        
+        第一列是日期的纳秒整数排序键，其余列与最终输出相同；
+        同时在 flags 中记录日期的精度，归并时按整个月份的精度统一格式化日期。
+        """
+        df_output = self._output_frame(df).sort_values('date', kind='stable')
+        dates = df_output['date']
+        keys = dates.to_numpy(dtype='datetime64[ns]').view('int64')
+        valid = keys[dates.notna().to_numpy()]
+        flags['dates_only'] &= bool((valid % (86400 * 10**9) == 0).all())
+        flags['ns'] |= bool((valid % 1000 != 0).any())
+        flags['us'] |= bool((valid // 1000 % 1000 != 0).any())
+        flags['ms'] |= bool((valid // 10**6 % 1000 != 0).any())
+        
+        df_output = df_output.assign(date=np.where(dates.notna().to_numpy(), keys, _NAT_SORT_KEY))
+        df_output.to_csv(run_path, index=False, header=False)
+    
+    def _merge_runs(self, run_paths, file_path, flags, fan_in=MERGE_FAN_IN):
+        """k路归并一个月份的有序段文件并写出月度文件
+        
+        heapq.merge 在排序键相同时按段的顺序输出，段又按文件和块的顺序排列，
+        因此结果与整体稳定排序相同。段多于 fan_in 个时，先把相邻的每 fan_in 个段归并成
+        一个新段（保持段的顺序，结果不变），直到剩下的段不超过 fan_in 个。
+        """
+        run_paths = list(run_paths)
+        merge_pass = 0
+        while len(run_paths) > fan_in:
+            merged_paths = []
+            for start in range(0, len(run_paths), fan_in):
+                group = run_paths[start:start + fan_in]
+                if len(group) == 1:
+                    merged_paths.append(group[0])
+                    continue
+                merged_path = group[0].with_name(f"{group[0].stem}-pass{merge_pass}.csv")
+                with self._merged_runs(group) as rows, open(merged_path, 'w', newline='', encoding='utf-8') as f:
+                    csv.writer(f).writerows(rows)
+                for run_path in group:
+                    run_path.unlink()
+                merged_paths.append(merged_path)
+            run_paths = merged_paths
+            merge_pass += 1
+        
+        formatted = {}
+        with self._merged_runs(run_paths) as rows, atomic_open(file_path, newline='') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(OUTPUT_COLUMNS)
+            for row in rows:
+                date = formatted.get(row[0])
+                if date is None:
+                    date = formatted[row[0]] = self._format_date_key(int(row[0]), flags)
+                row[0] = date
+                writer.writerow(row)
+    
+    @staticmethod
+    @contextmanager
+    def _merged_runs(run_paths):
+        """打开一组有序段文件，产生按排序键归并后的行，退出时关闭所有文件"""
+        run_files = [open(run_path, newline='', encoding='utf-8') for run_path in run_paths]
+        try:
+            yield heapq.merge(*(csv.reader(f) for f in run_files), key=lambda row: int(row[0]))
+        finally:
+            for f in run_files:
+                f.close()
+    
+    @staticmethod
+    def _format_date_key(key, flags):
+        """按 pandas to_csv 的规则格式化纳秒排序键：全为午夜时只写日期，否则按整列最高精度写小数秒"""
+        if key == _NAT_SORT_KEY:
+            return ''
+        seconds, nanoseconds = divmod(key, 10**9)
+        value = _EPOCH + timedelta(seconds=seconds)
+        text = f"{value.year}-{value.month:02d}-{value.day:02d}"
+        if flags['dates_only']:
+            return text
+        text += f" {value.hour:02d}:{value.minute:02d}:{value.second:02d}"
+        if flags['ns']:
+            text += f".{nanoseconds:09d}"
+        elif flags['us']:
+            text += f".{nanoseconds // 1000:06d}"
+        elif flags['ms']:
+            text += f".{nanoseconds // 10**6:03d}"
+        return text
+    
+    def _output_frame(self, df):
+        """按输出列顺序投影出月度输出：date, description, amount, category, bank, comment
+        
+        原来的comment列作为category，新的comment列为空白。新DataFrame只引用原有的列，
+        不复制数据（此前的 copy + rename + 重新排列每个月要复制两到三次）。
+        """
+        blank = pd.Series('', index=df.index, dtype=object)
+        columns = {
+            'date': df['date'],
+            'description': df['description'],
+            'amount': df['amount'],
+            'category': df['comment'] if 'comment' in df.columns else blank,
+            'bank': df['bank'],
+            'comment': blank,
+        }
+        return pd.DataFrame(columns, columns=OUTPUT_COLUMNS, copy=False)
@@ -0,0 +1,38 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# 进程的 umask，只在导入时读取一次（os.umask 只能通过设置来读取，线程中调用不安全）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', newline=None):
+    """原子写入文件：先写同目录下的临时文件，成功后再重命名覆盖目标文件
+
+    写入过程中出错或进程崩溃时，目标文件保持原样，不会留下写了一半的内容。
+    替换后保留目标文件原来的权限；新文件使用 umask 决定的默认权限（mkstemp 创建的临时文件只有 0600）。
+    """
+    path = Path(path)
+    binary = 'b' in mode
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=None if binary else encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            file_mode = stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            file_mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, file_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,106 @@
+import difflib
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+
+class FuzzyIndex:
+    """基于字符n-gram倒排索引的模糊匹配
+
+    替代对全部映射键调用 difflib.get_close_matches 的线性扫描：
+    先用n-gram倒排索引找出共享片段最多的候选键，再用与difflib相同的
+    SequenceMatcher相似度对有限数量的候选重新排序。
+    映射较小时（不超过 max_candidates）直接比较全部键，结果与difflib完全一致。
+    """
+
+    def __init__(self, keys=(), ngram=3, max_candidates=50, cutoff=0.6):
+        self.ngram = ngram
+        self.max_candidates = max_candidates
+        self.cutoff = cutoff
+        self.keys = []
+        self._key_ids = {}
+        self._postings = defaultdict(list)
+        for key in keys:
+            self.add(key)
+
+    def to_state(self):
+        """导出为只包含内置类型的状态，便于写入快照"""
+        return {
+            'ngram': self.ngram,
+            'max_candidates': self.max_candidates,
+            'cutoff': self.cutoff,
+            'keys': self.keys,
+            # 紧凑的整数数组比Python列表反序列化快得多
+            'postings': {gram: array('i', key_ids) for gram, key_ids in self._postings.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """从 to_state() 的结果恢复索引，无需重新切分n-gram"""
+        index = cls(ngram=state['ngram'], max_candidates=state['max_candidates'], cutoff=state['cutoff'])
+        index.keys = state['keys']
+        index._key_ids = {key: key_id for key_id, key in enumerate(index.keys)}
+        index._postings = defaultdict(list, state['postings'])
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._key_ids
+
+    def _grams(self, text):
+        """返回文本的n-gram集合"""
+        n = self.ngram
+        if len(text) <= n:
+            return {text} if text else set()
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, key):
+        """增量添加一个映射键"""
+        if key in self._key_ids:
+            return
+        key_id = len(self.keys)
+        self.keys.append(key)
+        self._key_ids[key] = key_id
+        for gram in self._grams(key):
+            self._postings[gram].append(key_id)
+
+    def candidates(self, text):
+        """返回需要精确计算相似度的候选键"""
+        if len(self.keys) <= self.max_candidates:
+            return self.keys
+
+        shared = Counter()
+        for gram in self._grams(text):
+            postings = self._postings.get(gram)
+            if postings:
+                shared.update(postings)
+
+        # 长度剪枝：ratio <= 2*min(la, lb)/(la + lb)，达不到阈值的键不可能匹配
+        text_len = len(text)
+        min_len = text_len * self.cutoff / (2 - self.cutoff)
+        max_len = text_len * (2 - self.cutoff) / self.cutoff
+        key_ids = [
+            key_id for key_id in shared
+            if min_len <= len(self.keys[key_id]) <= max_len
+        ]
+        key_ids = heapq.nlargest(self.max_candidates, key_ids, key=shared.__getitem__)
+        return [self.keys[key_id] for key_id in key_ids]
+
+    def best_match(self, text):
+        """返回最相似的映射键，没有达到阈值时返回None
+
+        打分与平局处理和 difflib.get_close_matches(text, keys, n=1) 相同。
+        """
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(text)
+        best = None
+        for key in self.candidates(text):
+            matcher.set_seq1(key)
+            if (matcher.real_quick_ratio() >= self.cutoff and
+                    matcher.quick_ratio() >= self.cutoff):
+                score = matcher.ratio()
+                if score >= self.cutoff and (best is None or (score, key) > best):
+                    best = (score, key)
+        return best[1] if best else None
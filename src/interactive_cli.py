@@ -1,3 +1,5 @@
+import pandas as pd
+
 try:
     from .category_manager import CategoryManager
 except ImportError:
@@ -20,62 +22,139 @@ class InteractiveCLI:
         month_text = f" in {month}" if month else ""
         print(f"Found {len(unmapped)} unmapped descriptions{month_text}:")
         
-        skip_all = False
-        
         for desc in unmapped:
-            if skip_all:
-                break
             print(f"\nDescription: '{desc}'")
+            if self.prompt_category(desc) == 'skip-all':
+                break
+        
+        # 重新应用分类
+        return self.cm.apply_categories(df)
+    
+    def update_all_categories(self, monthly_data):
+        """跨月份交互式分类：每个未分类的描述在所有月份中只询问一次
+        
+        未分类的描述按出现次数、再按总金额（绝对值）从大到小排列，影响最大的先问。
+        询问结束后只重新分类受影响的行，不再对每个月份整体重新分类。
+        
+        Args:
+            monthly_data: {月份: 已应用分类的DataFrame}，原地更新 comment 列
+        """
+        unmapped = self.collect_unmapped(monthly_data)
+        if unmapped.empty:
+            print("All descriptions have been categorized!")
+            return monthly_data
+        
+        print(f"Found {len(unmapped)} unmapped descriptions across {len(monthly_data)} months:")
+        
+        # 会话开始前已有直接映射的描述，不会受本次添加的映射和模式影响
+        mapped_before = set(self.cm.mapping)
+        changed = False
+        for row in unmapped.itertuples(index=False):
+            print(f"\nDescription: '{row.description}' "
+                  f"({row.count} transactions in {row.months} months, total ${row.total_amount:.2f})")
+            result = self.prompt_category(row.description)
+            if result == 'skip-all':
+                break
+            if result != 'skip':
+                changed = True
+        
+        if changed:
+            self.recategorize(monthly_data, mapped_before)
+        return monthly_data
+    
+    @staticmethod
+    def collect_unmapped(monthly_data):
+        """汇总所有月份中未分类的描述：出现次数、涉及月份数和总金额（绝对值），按影响从大到小排序"""
+        frames = []
+        for month, df in monthly_data.items():
+            rows = df.loc[df['comment'].isna() & df['description'].notna(), ['description', 'amount']]
+            frames.append(rows.assign(month=month))
+        if not frames:
+            return pd.DataFrame(columns=['description', 'count', 'months', 'total_amount'])
+        
+        rows = pd.concat(frames, ignore_index=True)
+        rows['description'] = rows['description'].astype(object)
+        rows['amount'] = rows['amount'].abs()
+        unmapped = rows.groupby('description', sort=False).agg(
+            count=('amount', 'size'), months=('month', 'nunique'), total_amount=('amount', 'sum')
+        ).reset_index()
+        return unmapped.sort_values(
+            ['count', 'total_amount', 'description'], ascending=[False, False, True], kind='stable', ignore_index=True
+        )
+    
+    def recategorize(self, monthly_data, mapped_before):
+        """只重新分类受影响的行
+        
+        会话开始前已有直接映射的描述结果不会变化（直接匹配优先于模式和模糊匹配），
+        其余描述（模式匹配、模糊匹配或未分类的）可能受到新映射和新模式影响。
+        这些描述在所有月份中去重后只分类一次，再写回对应的行。
+        """
+        masks = {
+            month: df['description'].notna().to_numpy() & ~df['description'].isin(mapped_before).to_numpy()
+            for month, df in monthly_data.items()
+        }
+        affected = pd.unique(pd.concat(
+            [df['description'][masks[month]].astype(object) for month, df in monthly_data.items()], ignore_index=True
+        ))
+        categories = dict(zip(affected, self.cm.categorize_series(pd.Series(affected, dtype=object))))
+        
+        rows = 0
+        for month, df in monthly_data.items():
+            mask = masks[month]
+            df.loc[mask, 'comment'] = df.loc[mask, 'description'].astype(object).map(categories)
+            rows += int(mask.sum())
+        print(f"Recategorized {rows} affected rows ({len(affected)} distinct descriptions)")
+    
+    def prompt_category(self, desc):
+        """询问一个描述的分类并保存，返回 'skip'、'skip-all' 或输入的分类"""
+        # 显示类似的已有分类
+        similar = self.suggest_similar_categories(desc)
+        if similar:
+            print("Similar existing categories:")
+            for i, cat in enumerate(similar, 1):
+                print(f"  {i}. {cat}")
+        
+        while True:
+            category = input("Enter category (or 'skip' to skip, 'skip-all' to skip all remaining): ").strip()
             
-            # 显示类似的已有分类
-            similar = self.suggest_similar_categories(desc)
-            if similar:
-                print("Similar existing categories:")
-                for i, cat in enumerate(similar, 1):
-                    print(f"  {i}. {cat}")
+            if category.lower() == 'skip':
+                return 'skip'
+            elif category.lower() == 'skip-all':
+                print("Skipping all remaining unmapped descriptions...")
+                return 'skip-all'
             
-            while True:
-                category = input("Enter category (or 'skip' to skip, 'skip-all' to skip all remaining): ").strip()
-                
-                if category.lower() == 'skip':
-                    break
-                elif category.lower() == 'skip-all':
-                    skip_all = True
-                    print("Skipping all remaining unmapped descriptions...")
-                    break
+            if category:
+                self.cm.add_mapping(desc, category, is_programmatic=False)
+                print(f"Added: '{desc}' -> '{category}'")
                 
-                if category:
-                    self.cm.add_mapping(desc, category, is_programmatic=False)
-                    print(f"Added: '{desc}' -> '{category}'")
+                # 建议通用模式
+                patterns = self.cm.suggest_pattern_from_mapping(desc, category)
+                if patterns:
+                    print(f"\nSuggested patterns for automatic matching:")
+                    for pattern in patterns:
+                        print(f"  - {pattern}")
                     
-                    # 建议通用模式
-                    patterns = self.cm.suggest_pattern_from_mapping(desc, category)
-                    if patterns:
-                        print(f"\nSuggested patterns for automatic matching:")
-                        for pattern in patterns:
-                            print(f"  - {pattern}")
-                        
-                        add_pattern = input("Add any pattern? (y/N or specify pattern): ").strip()
-                        if add_pattern.lower() == 'y' and patterns:
-                            # 添加第一个建议的模式
-                            self.cm.add_pattern(patterns[0], category)
-                            print(f"Added pattern: '{patterns[0]}' -> '{category}'")
-                        elif add_pattern and add_pattern.lower() != 'n':
-                            # 用户指定的模式
+                    add_pattern = input("Add any pattern? (y/N or specify pattern): ").strip()
+                    if add_pattern.lower() == 'y' and patterns:
+                        # 添加第一个建议的模式
+                        self.cm.add_pattern(patterns[0], category)
+                        print(f"Added pattern: '{patterns[0]}' -> '{category}'")
+                    elif add_pattern and add_pattern.lower() != 'n':
+                        # 用户指定的模式
+                        try:
                             self.cm.add_pattern(add_pattern, category)
                             print(f"Added pattern: '{add_pattern}' -> '{category}'")
-                    
-                    break
-                else:
-                    print("Please enter a valid category or 'skip'")
-        
-        # 重新应用分类
-        return self.cm.apply_categories(df)
+                        except ValueError as e:
+                            print(f"Pattern not added: {e}")
+                
+                return category
+            else:
+                print("Please enter a valid category or 'skip'")
     
     def suggest_similar_categories(self, description):
         """建议相似的分类"""
         import difflib
-        existing_categories = list(set(self.cm.mapping.values()))
+        existing_categories = list(self.cm.get_categories())
         return difflib.get_close_matches(
             description.lower(), 
             [cat.lower() for cat in existing_categories], 
@@ -1,48 +1,115 @@
 import pandas as pd
+import numpy as np
+import glob
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 try:
     from .category_manager import CategoryManager
     from .interactive_cli import InteractiveCLI
+    from .file_utils import atomic_open
 except ImportError:
     # For when running tests or standalone
     from category_manager import CategoryManager
     from interactive_cli import InteractiveCLI
+    from file_utils import atomic_open
+
+# 学习时与现有映射冲突的处理策略
+#   ask: 逐个询问（默认）
+#   keep-existing: 保留现有映射
+#   prefer-new: 使用CSV中与现有映射不同的分类，有多个时取文件中最后出现的
+#   majority: CSV中出现次数最多的分类（现有映射也计入CSV中的出现次数，平局时保留现有映射）
+#   most-recent: 日期最近的交易的分类（日期相同或无法解析时取文件中靠后的）
+CONFLICT_POLICIES = ['ask', 'keep-existing', 'prefer-new', 'majority', 'most-recent']
+
+# 学习文件（与输出文件格式相同）必须包含的列
+REQUIRED_COLUMNS = ['date', 'description', 'amount', 'category', 'bank']
+
+def find_learning_files(source):
+    """把 --learn-from 的参数展开为文件列表：单个文件、目录（其中的 *.csv）或通配符"""
+    path = Path(source)
+    if path.is_dir():
+        return sorted(path.glob('*.csv'))
+    if glob.has_magic(str(source)):
+        return sorted(Path(file_path) for file_path in glob.glob(str(source), recursive=True))
+    return [path]
 
 class LearningMode:
-    def __init__(self, category_manager):
+    def __init__(self, category_manager, conflict_policy='ask', interactive=True):
+        """
+        Args:
+            category_manager: CategoryManager 实例
+            conflict_policy: 冲突处理策略，见 CONFLICT_POLICIES
+            interactive: 为 False 时不做任何询问，'ask' 策略下的冲突保持不变、只写入冲突报告
+        """
+        if conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy '{conflict_policy}', expected one of {CONFLICT_POLICIES}")
         self.cm = category_manager
         self.cli = InteractiveCLI(category_manager)
+        self.conflict_policy = conflict_policy
+        self.interactive = interactive
+        # 本次学习中遇到的所有冲突及其处理结果，用于冲突报告
+        self.conflicts = []
     
     def learn_from_csv(self, csv_file_path):
         """从CSV文件学习分类"""
+        return self.learn_from_files([csv_file_path])
+    
+    def learn_from_files(self, file_paths, workers=1, pool="thread"):
+        """从多个CSV文件学习分类，所有文件的投票汇总后一次性提交
+        
+        每个文件只被归纳为 (描述, 分类) 的出现次数和日期，不在内存中保留全部交易；
+        汇总后的结果只与映射比较一次，所以耗时与总行数成正比，而不是文件数 × 映射大小。
+        格式错误的文件会被跳过。
+        
+        Args:
+            file_paths: 学习文件列表（按时间顺序，文件顺序用于冲突策略的先后判断）
+            workers: 并行读取文件的工作线程/进程数，1 表示逐个读取
+            pool: 并行方式，"thread" 或 "process"
+        
+        Returns:
+            bool: 至少有一个文件被成功学习时为 True
+        """
         try:
-            df = pd.read_csv(csv_file_path)
-            print(f"Loading learning data from: {csv_file_path}")
+            file_paths = [Path(file_path) for file_path in file_paths]
+            if len(file_paths) == 1:
+                print(f"Loading learning data from: {file_paths[0]}")
+            else:
+                print(f"Loading learning data from {len(file_paths)} files")
+            
+            summaries = []
+            total_rows = 0
+            rows_with_category = 0
+            for file_path, summary, error in self._summarize_files(file_paths, workers, pool):
+                if error is not None:
+                    print(f"Error: Skipping learning file {file_path}: {error}")
+                    continue
+                pairs, uncategorized, rows, categorized_rows = summary
+                # 行号按文件顺序连续编号
+                pairs['first_row'] += total_rows
+                pairs['last_row'] += total_rows
+                summaries.append((pairs, uncategorized))
+                total_rows += rows
+                rows_with_category += categorized_rows
             
-            # 验证CSV格式
-            required_columns = ['date', 'description', 'amount', 'category', 'bank']
-            if not all(col in df.columns for col in required_columns):
-                print(f"Error: CSV file must contain columns: {required_columns}")
+            if not summaries:
                 return False
             
-            # 统计信息
-            total_rows = len(df)
-            rows_with_category = df['category'].notna().sum()
             rows_without_category = total_rows - rows_with_category
-            
             print(f"Found {total_rows} transactions:")
             print(f"  - {rows_with_category} with categories")
             print(f"  - {rows_without_category} without categories")
             
-            # 1. 学习已有分类
-            learned_mappings = self._learn_existing_categories(df)
+            # 1. 学习已有分类（所有文件汇总后只提交一次）
+            pairs = self._combine_pairs([pairs for pairs, _ in summaries])
+            learned_mappings = self._learn_pairs(pairs) if len(pairs) else 0
             
-            # 2. 处理未分类的交易
-            if rows_without_category > 0:
+            # 2. 处理未分类的交易（每个描述只询问一次）
+            if rows_without_category > 0 and self.interactive:
                 print(f"\nProcessing {rows_without_category} uncategorized transactions...")
-                self._process_uncategorized(df)
+                uncategorized = pd.concat([uncategorized for _, uncategorized in summaries], ignore_index=True)
+                self._process_uncategorized(uncategorized.drop_duplicates('description'))
             
             print(f"\nLearning completed!")
             print(f"Added {learned_mappings} new category mappings")
@@ -53,46 +120,251 @@ class LearningMode:
             print(f"Error processing learning file: {e}")
             return False
     
+    def _summarize_files(self, file_paths, workers=1, pool="thread"):
+        """归纳多个学习文件，按输入顺序逐个返回 (文件路径, 归纳结果, 错误)"""
+        if workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                try:
+                    yield file_path, self._summarize_file(file_path), None
+                except Exception as e:
+                    yield file_path, None, e
+            return
+        
+        if pool == "process":
+            executor_class = ProcessPoolExecutor
+        elif pool == "thread":
+            executor_class = ThreadPoolExecutor
+        else:
+            raise ValueError(f"Unknown pool type: {pool}. Expected 'thread' or 'process'")
+        
+        with executor_class(max_workers=workers) as executor:
+            futures = [executor.submit(LearningMode._summarize_file, file_path) for file_path in file_paths]
+            # 按提交顺序收集结果，行号和投票顺序与逐个读取时相同
+            for file_path, future in zip(file_paths, futures):
+                try:
+                    yield file_path, future.result(), None
+                except Exception as e:
+                    yield file_path, None, e
+    
+    @staticmethod
+    def _summarize_file(file_path):
+        """读取一个学习文件，返回 (分类投票, 去重后的未分类交易, 行数, 有分类的行数)"""
+        df = pd.read_csv(file_path)
+        if not all(col in df.columns for col in REQUIRED_COLUMNS):
+            raise ValueError(f"CSV file must contain columns: {REQUIRED_COLUMNS}")
+        
+        categorized = df['category'].notna() & (df['category'] != '') & df['description'].notna()
+        pairs = LearningMode._aggregate_pairs(df[categorized])
+        uncategorized = df[df['category'].isna() | (df['category'] == '')].drop_duplicates('description')
+        return pairs, uncategorized, len(df), int(df['category'].notna().sum())
+    
     def _learn_existing_categories(self, df):
         """学习已有的分类映射"""
-        learned_count = 0
-        categorized_df = df[df['category'].notna()]
+        categorized_df = df[df['category'].notna() & (df['category'] != '') & df['description'].notna()]
         
         if len(categorized_df) == 0:
-            return learned_count
+            return 0
+        
+        return self._learn_pairs(self._aggregate_pairs(categorized_df))
+    
+    def _learn_pairs(self, pairs):
+        """提交汇总后的 (描述, 分类) 投票
         
-        print(f"\nLearning from {len(categorized_df)} categorized transactions...")
+        与现有映射做向量化比较：不冲突的新映射批量添加，所有冲突收集到一个队列里统一处理，
+        全部修改最后只写一次文件。
+        """
+        print(f"\nLearning from {int(pairs['count'].sum())} categorized transactions...")
         
-        for _, row in categorized_df.iterrows():
-            description = row['description']
-            category = row['category']
-            
-            # 检查是否已经有这个映射
-            existing_category = self.cm.get_exact_match(description)
+        additions, conflicts = self._diff_pairs(pairs)
+        
+        # 新映射和冲突的处理结果在退出批量时一起写入
+        with self.cm.batch():
+            learned_count = len(additions)
+            if additions:
+                self.cm.add_mappings(additions, is_programmatic=True)
+                print(f"  Learned {learned_count} new mappings (UNCONFIRMED)")
             
-            if existing_category is None:
-                # 添加新的映射 - 从CSV学习，标记为程序自动添加
-                self.cm.add_mapping(description, category, is_programmatic=True)
-                learned_count += 1
-                print(f"  Learned: '{description}' -> '{category}' (UNCONFIRMED)")
-            elif existing_category != category:
-                # 映射冲突，询问用户
+            if len(conflicts):
+                print(f"\n{len(conflicts)} conflicts with existing mappings")
+                learned_count += self._resolve_conflicts(conflicts)
+        
+        return learned_count
+    
+    @staticmethod
+    def _aggregate_pairs(categorized_df):
+        """把有分类的交易归纳为 (描述, 分类) 投票：出现次数、首末行号和最近日期，按首次出现排序"""
+        rows = categorized_df[['description', 'category']].astype(object).assign(
+            row=np.arange(len(categorized_df)), last_seen=LearningMode._parse_learning_dates(categorized_df)
+        )
+        # groupby(sort=False) 保持首次出现的顺序
+        return rows.groupby(['description', 'category'], sort=False).agg(
+            count=('row', 'size'), first_row=('row', 'min'), last_row=('row', 'max'), last_seen=('last_seen', 'max')
+        ).reset_index()
+    
+    @staticmethod
+    def _combine_pairs(pairs_list):
+        """合并多个文件的投票（行号已连续编号）"""
+        pairs = pd.concat(pairs_list, ignore_index=True)
+        pairs = pairs.groupby(['description', 'category'], sort=False).agg(
+            count=('count', 'sum'), first_row=('first_row', 'min'), last_row=('last_row', 'max'),
+            last_seen=('last_seen', 'max')
+        ).reset_index()
+        return pairs.sort_values('first_row', kind='stable', ignore_index=True)
+    
+    def _diff_pairs(self, pairs):
+        """把 (描述, 分类) 投票与现有映射比较，返回 (新映射字典, 冲突DataFrame)
+        
+        冲突包含 description/existing/category/count 列，count 是该分类在CSV中出现的次数，
+        另有冲突策略使用的 first_row/last_row/last_seen（以及现有分类对应的 existing_* 列）。
+        同一描述在CSV中有多个分类时，第一个出现的分类作为新映射，其余的作为与它的冲突。
+        规范化后相同的描述（见 CategoryManager.match_keys）合并投票，以第一个出现的原始描述为代表。
+        """
+        if self.cm.normalizer.enabled:
+            keys = self.cm.match_keys(pairs['description'])
+            representative = pairs['description'].groupby(keys.to_numpy(), sort=False).transform('first')
+            pairs = self._combine_pairs([pairs.assign(description=representative)])
+        
+        existing = self.cm.get_exact_matches(pairs['description'])
+        first_new = pairs[existing.isna()].drop_duplicates('description')
+        additions = dict(zip(first_new['description'], first_new['category']))
+        
+        existing = existing.fillna(pairs['description'].map(additions))
+        conflicts = pairs.assign(existing=existing)[existing != pairs['category']]
+        
+        # 现有分类在CSV中的出现情况（没有出现时为0/NaT）
+        support = pairs.rename(columns={
+            'category': 'existing', 'count': 'existing_count', 'first_row': 'existing_first_row',
+            'last_row': 'existing_last_row', 'last_seen': 'existing_last_seen'
+        })
+        conflicts = conflicts.merge(support, on=['description', 'existing'], how='left')
+        conflicts = conflicts.fillna({'existing_count': 0, 'existing_first_row': -1, 'existing_last_row': -1})
+        columns = ['description', 'existing', 'category', 'count', 'first_row', 'last_row', 'last_seen',
+                   'existing_count', 'existing_first_row', 'existing_last_row', 'existing_last_seen']
+        return additions, conflicts[columns].reset_index(drop=True)
+    
+    @staticmethod
+    def _parse_learning_dates(df):
+        """解析学习文件中的日期（输出文件使用ISO格式），没有日期列或无法解析时为 NaT"""
+        if 'date' not in df.columns:
+            return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+        return pd.to_datetime(df['date'], errors='coerce', format='ISO8601')
+    
+    def _resolve_conflicts(self, conflicts):
+        """按冲突策略处理冲突，返回更新的映射数"""
+        if self.conflict_policy == 'ask':
+            if self.interactive:
+                return self._ask_conflicts(conflicts)
+            for row in conflicts.itertuples(index=False):
+                self._record_conflict(row, None, 'unresolved')
+            print(f"  Left {len(conflicts)} conflicts unresolved (non-interactive)")
+            return 0
+        
+        winners = self._choose_categories(conflicts, self.conflict_policy)
+        changed = winners[winners['category'] != winners['existing']]
+        updates = dict(zip(changed['description'], changed['category']))
+        
+        resolved = conflicts.merge(
+            winners[['description', 'category']].rename(columns={'category': 'resolution'}), on='description'
+        )
+        for row in resolved.itertuples(index=False):
+            self._record_conflict(row, row.resolution, 'updated' if row.description in updates else 'kept')
+        # 按策略自动选择的分类没有经过用户确认
+        self.cm.add_mappings(updates, is_programmatic=True)
+        print(f"  Resolved {len(winners)} conflicting descriptions with policy '{self.conflict_policy}': "
+              f"{len(updates)} updated, {len(winners) - len(updates)} kept")
+        return len(updates)
+    
+    @staticmethod
+    def _choose_categories(conflicts, policy):
+        """按策略为每个冲突的描述选出一个分类，返回 description/existing/category 三列（向量化）"""
+        existing = conflicts.drop_duplicates('description')
+        candidates = pd.concat([
+            pd.DataFrame({
+                'description': existing['description'], 'existing': existing['existing'],
+                'category': existing['existing'], 'count': existing['existing_count'],
+                'first_row': existing['existing_first_row'], 'last_row': existing['existing_last_row'],
+                'last_seen': existing['existing_last_seen'], 'is_existing': True,
+            }),
+            conflicts[['description', 'existing', 'category', 'count', 'first_row', 'last_row', 'last_seen']]
+            .assign(is_existing=False),
+        ], ignore_index=True)
+        
+        if policy == 'keep-existing':
+            order = (['is_existing'], [False])
+        elif policy == 'prefer-new':
+            order = (['is_existing', 'last_row'], [True, False])
+        elif policy == 'majority':
+            order = (['count', 'is_existing', 'first_row'], [False, False, True])
+        elif policy == 'most-recent':
+            order = (['last_seen', 'last_row'], [False, False])
+        else:
+            raise ValueError(f"Unknown conflict policy '{policy}'")
+        
+        by, ascending = order
+        winners = candidates.sort_values(by, ascending=ascending, kind='stable', na_position='last')
+        winners = winners.drop_duplicates('description')
+        # 恢复冲突的原始顺序
+        winners = winners.set_index('description').loc[existing['description']].reset_index()
+        return winners[['description', 'existing', 'category']]
+    
+    def _ask_conflicts(self, conflicts):
+        """逐个询问冲突的处理方式，所有修改结束时只写一次文件，返回更新的映射数"""
+        updated_count = 0
+        with self.cm.batch():
+            for row in conflicts.itertuples(index=False):
+                # 前面的选择可能已经把映射改成了这个分类
+                existing_category = self.cm.get_exact_match(row.description)
+                if existing_category == row.category:
+                    continue
+                
                 print(f"\nConflict found:")
-                print(f"  Description: '{description}'")
+                print(f"  Description: '{row.description}'")
                 print(f"  Existing mapping: '{existing_category}'")
-                print(f"  New mapping: '{category}'")
+                print(f"  New mapping: '{row.category}'")
                 
                 choice = input("Keep (e)xisting, use (n)ew, or (s)kip? [e/n/s]: ").strip().lower()
                 if choice == 'n':
-                    self.cm.add_mapping(description, category, is_programmatic=False)
-                    learned_count += 1
-                    print(f"  Updated: '{description}' -> '{category}'")
+                    self.cm.add_mapping(row.description, row.category, is_programmatic=False)
+                    updated_count += 1
+                    self._record_conflict(row, row.category, 'updated')
+                    print(f"  Updated: '{row.description}' -> '{row.category}'")
                 elif choice == 'e':
+                    self._record_conflict(row, existing_category, 'kept')
                     print(f"  Kept existing mapping")
                 else:
+                    self._record_conflict(row, None, 'skipped')
                     print(f"  Skipped")
         
-        return learned_count
+        return updated_count
+    
+    def _record_conflict(self, row, resolution, action):
+        """记录一个冲突的 (描述, 分类) 及其处理结果"""
+        self.conflicts.append({
+            'description': row.description,
+            'existing': row.existing,
+            'existing_count': int(row.existing_count),
+            'category': row.category,
+            'count': int(row.count),
+            'last_seen': row.last_seen.date().isoformat() if pd.notna(row.last_seen) else None,
+            'policy': self.conflict_policy,
+            'resolution': resolution,
+            'action': action,
+        })
+    
+    def write_conflict_report(self, report_path):
+        """把本次学习的冲突写成JSON报告（原子写入），便于无人值守运行后复查"""
+        report = {
+            'policy': self.conflict_policy,
+            'conflicts': self.conflicts,
+            'summary': {
+                action: sum(1 for conflict in self.conflicts if conflict['action'] == action)
+                for action in ('updated', 'kept', 'skipped', 'unresolved')
+            },
+        }
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(report_path) as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Conflict report written to {report_path} ({len(self.conflicts)} conflicts)")
     
     def _process_uncategorized(self, df):
         """处理未分类的交易"""
@@ -160,8 +432,11 @@ class LearningMode:
                             print(f"Added pattern: '{patterns[0]}' -> '{category}'")
                         elif add_pattern and add_pattern.lower() != 'n':
                             # 用户指定的模式
-                            self.cm.add_pattern(add_pattern, category)
-                            print(f"Added pattern: '{add_pattern}' -> '{category}'")
+                            try:
+                                self.cm.add_pattern(add_pattern, category)
+                                print(f"Added pattern: '{add_pattern}' -> '{category}'")
+                            except ValueError as e:
+                                print(f"Pattern not added: {e}")
                     
                     break
                 else:
@@ -0,0 +1,82 @@
+import json
+import re
+
+# 默认的规范化规则，可以在 config/matching.json 的 "normalization" 中逐项关闭
+DEFAULT_NORMALIZATION = {
+    'enabled': True,
+    'uppercase': True,
+    # "Value Date: 29/06/2025"
+    'strip_value_dates': True,
+    # "AUS Card xx2644"
+    'strip_card_suffixes': True,
+    # 纯数字的词，例如门店编号 "3133"、订单号 "#456"
+    'strip_digit_tokens': True,
+    'collapse_whitespace': True,
+    # 额外要删除的正则表达式
+    'extra_patterns': [],
+}
+
+VALUE_DATE_PATTERN = r'\bValue\s+Date:?\s*\d{1,2}/\d{1,2}/\d{2,4}'
+CARD_SUFFIX_PATTERN = r'\b(?:AUS\s+)?Card\s+x+\d+\b'
+DIGIT_TOKEN_PATTERN = r'(?<!\S)#?\d+(?!\S)'
+
+
+class DescriptionNormalizer:
+    """把交易描述规范化为匹配用的键，去掉每笔交易都不同的部分
+
+    例如 "WOOLWORTHS 3133 CHADSTO CHADSTONE AUS Card xx2644 Value Date: 29/06/2025"
+    规范化为 "WOOLWORTHS CHADSTO CHADSTONE"。规范化后的文本只用于直接匹配的键和模糊索引，
+    映射文件和输出中仍然保留原始描述。规则全部删除后为空的描述保持原样（只做大小写和空白处理）。
+    """
+
+    def __init__(self, **config):
+        unknown = set(config) - set(DEFAULT_NORMALIZATION)
+        if unknown:
+            raise ValueError(f"Unknown normalization options: {sorted(unknown)}")
+        self.config = {**DEFAULT_NORMALIZATION, **config}
+        self.enabled = bool(self.config['enabled'])
+
+        patterns = []
+        if self.config['strip_value_dates']:
+            patterns.append(VALUE_DATE_PATTERN)
+        if self.config['strip_card_suffixes']:
+            patterns.append(CARD_SUFFIX_PATTERN)
+        patterns.extend(self.config['extra_patterns'])
+        # 数字词放在最后，前面的规则删除后才露出来的数字也能去掉
+        if self.config['strip_digit_tokens']:
+            patterns.append(DIGIT_TOKEN_PATTERN)
+        try:
+            self._strip = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE) if patterns else None
+        except re.error as e:
+            raise ValueError(f"Invalid normalization pattern: {e}")
+
+    def config_key(self):
+        """规则的稳定表示，用于快照和缓存的失效判断"""
+        return json.dumps(self.config if self.enabled else {'enabled': False}, sort_keys=True)
+
+    def normalize(self, text):
+        """规范化一个描述"""
+        if not self.enabled or not isinstance(text, str):
+            return text
+        return self._clean(self._strip.sub(' ', text) if self._strip else text) or self._clean(text)
+
+    def normalize_series(self, descriptions):
+        """向量化地规范化一列文本描述"""
+        if not self.enabled or len(descriptions) == 0:
+            return descriptions
+        stripped = descriptions.str.replace(self._strip, ' ', regex=True) if self._strip else descriptions
+        result = self._clean_series(stripped)
+        empty = result == ''
+        if empty.any():
+            result[empty] = self._clean_series(descriptions[empty])
+        return result
+
+    def _clean(self, text):
+        if self.config['collapse_whitespace']:
+            text = ' '.join(text.split())
+        return text.upper() if self.config['uppercase'] else text
+
+    def _clean_series(self, descriptions):
+        if self.config['collapse_whitespace']:
+            descriptions = descriptions.str.replace(r'\s+', ' ', regex=True).str.strip()
+        return descriptions.str.upper() if self.config['uppercase'] else descriptions
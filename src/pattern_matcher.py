@@ -0,0 +1,139 @@
+import re
+from collections import deque
+
+
+class PatternMatcher:
+    """把用户模式和内置关键词编译成一个Aho–Corasick自动机
+
+    每条规则按优先级编号：用户模式按插入顺序在前，内置关键词组按原顺序在后。
+    对描述只扫描一遍即可得到命中的最高优先级规则，匹配开销只与描述长度有关，
+    与规则数量无关。REGEX: 模式无法放进自动机，在构造时预编译，只对优先级
+    高于自动机结果的正则规则进行检查。
+
+    combine_regex=True 时把所有正则合并成一个带命名组的交替表达式，
+    一次匹配即可得到命中的最高优先级正则规则。
+    无效的正则不会参与匹配，记录在 invalid_patterns 中。
+    """
+
+    def __init__(self, patterns, built_in_patterns=(), combine_regex=False):
+        self.categories = []
+        self.regex_rules = []
+        self.invalid_patterns = []
+        self.combined_regex = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+
+        for pattern, category in patterns.items():
+            priority = self._add_rule(category)
+            if pattern.startswith('CONTAINS:'):
+                self._add_keyword(pattern[9:], priority)  # 与原逻辑一致，关键词不转大写
+            elif pattern.startswith('REGEX:'):
+                try:
+                    compiled = re.compile(pattern[6:], re.IGNORECASE)
+                except re.error as e:
+                    self.invalid_patterns.append((pattern, str(e)))
+                    continue
+                self.regex_rules.append((priority, compiled))
+            else:
+                # 默认为包含匹配
+                self._add_keyword(pattern.upper(), priority)
+
+        for category, keywords in built_in_patterns:
+            priority = self._add_rule(category)
+            for keyword in keywords:
+                self._add_keyword(keyword, priority)
+
+        self._build_failure_links()
+        if combine_regex and self.regex_rules:
+            self.combined_regex = self._combine_regex_rules()
+
+    def _add_rule(self, category):
+        self.categories.append(category)
+        return len(self.categories) - 1
+
+    def _add_keyword(self, keyword, priority):
+        """把关键词插入字典树，节点记录以该节点结尾的最高优先级"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        if self._best[state] is None or priority < self._best[state]:
+            self._best[state] = priority
+
+    def _combine_regex_rules(self):
+        """把正则规则合并成一个表达式，无法安全合并时返回None
+
+        每个分支是一个前瞻：只要该正则在描述任意位置命中，分支就成立；
+        分支按优先级排列，第一个成立的分支通过命名组告诉我们是哪条规则。
+        """
+        branches = []
+        for priority, compiled in self.regex_rules:
+            # 合并后分组编号会偏移，含数字反向引用的正则不能合并
+            if compiled.groups and re.search(r'\\[1-9]', compiled.pattern):
+                return None
+            branches.append(f'(?=[\\s\\S]*?(?:{compiled.pattern}))(?P<_rule{priority}>)')
+        try:
+            return re.compile('|'.join(branches), re.IGNORECASE)
+        except re.error:
+            # 例如内联全局标志或重复的组名
+            return None
+
+    def _build_failure_links(self):
+        """广度优先计算失败链接，并沿失败链合并最高优先级"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+            inherited = self._best[self._fail[state]]
+            if inherited is not None and (self._best[state] is None or inherited < self._best[state]):
+                self._best[state] = inherited
+
+    def search(self, description):
+        """单次扫描返回命中的最高优先级规则编号，没有命中时返回None"""
+        goto = self._goto
+        fail = self._fail
+        best_at = self._best
+        best = best_at[0]  # 空关键词总是命中
+        state = 0
+        for char in description:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            priority = best_at[state]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+
+        if self.combined_regex is not None:
+            match = self.combined_regex.match(description)
+            if match:
+                priority = int(match.lastgroup[5:])
+                if best is None or priority < best:
+                    return priority
+            return best
+
+        # 只需检查优先级更高的正则规则
+        for priority, compiled in self.regex_rules:
+            if best is not None and priority > best:
+                break
+            if compiled.search(description):
+                return priority
+        return best
+
+    def match(self, description):
+        """返回大写描述对应的分类，没有命中时返回None"""
+        priority = self.search(description)
+        if priority is None:
+            return None
+        return self.categories[priority]
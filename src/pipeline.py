@@ -0,0 +1,43 @@
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .category_manager import expand_categories
+except ImportError:
+    # For when running tests or standalone
+    from category_manager import expand_categories
+
+# 工作进程中的只读分类快照，由 _init_worker 在进程启动时设置一次
+_worker_snapshot = None
+
+def _init_worker(snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+def _categorize_unique(uniques):
+    return _worker_snapshot.categorize_unique(uniques)
+
+def categorize_months(monthly_data, category_manager, workers=1):
+    """按月份顺序逐个返回 (月份, 已分类的DataFrame)，分类结果写入 comment 列
+
+    workers > 1 时各月份在进程池中并行分类：每个工作进程启动时收到一份只读的
+    CategoryManager 快照（映射、编译好的模式、模糊索引），之后只传输每个月去重后的描述。
+    所有月份一开始就提交，调用方写出前面月份的同时，后面的月份仍在工作进程中计算。
+    结果按月份顺序返回，与逐月调用 apply_categories 相同。
+    """
+    if workers <= 1 or len(monthly_data) <= 1:
+        for month, df in monthly_data.items():
+            yield month, category_manager.apply_categories(df)
+        return
+
+    snapshot = category_manager.snapshot()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,)) as executor:
+        submitted = []
+        for month, df in monthly_data.items():
+            codes, uniques = pd.factorize(df['description'])
+            future = executor.submit(_categorize_unique, pd.Series(uniques, dtype=object))
+            submitted.append((month, df, codes, future))
+
+        for month, df, codes, future in submitted:
+            df['comment'] = expand_categories(codes, future.result(), df.index)
+            yield month, df
@@ -0,0 +1,142 @@
+import math
+import re
+from collections import defaultdict
+
+# 词：连续的字母数字（含撇号，例如 MCDONALD'S）
+TOKEN_PATTERN = re.compile(r"[A-Z0-9][A-Z0-9']*")
+
+
+def tokenize(text):
+    """把描述切分为去重的商户词，忽略纯数字和单个字符（门店编号、州缩写之外的噪声）"""
+    return {
+        token for token in TOKEN_PATTERN.findall(text.upper())
+        if len(token) > 1 and not token.isdigit()
+    }
+
+
+class TokenIndex:
+    """按IDF加权的商户词倒排索引，可替代 FuzzyIndex 作为模糊匹配阶段
+
+    每个映射键切分为词，词的权重为 idf = log(1 + N / df)：WOOLWORTHS、BUNNINGS 这类只在少数键中
+    出现的词权重高，AU、VIC、MELBOURNE 这类常见词权重低。候选键的得分是加权余弦相似度：
+    共享词权重平方和 / (查询词权重的范数 × 键词权重的范数)，达到 cutoff 的最高分键为最佳匹配，
+    平局时取较大的键（与 FuzzyIndex 一致）。
+
+    候选键只从较少见的词的倒排表收集（倒排表长度不超过 max_postings），常见词只为已有候选加分
+    （查询只含常见词时才从其中最少见的一个收集），所以查询耗时与映射大小基本无关。
+    """
+
+    def __init__(self, keys=(), cutoff=0.5, max_postings=500):
+        self.cutoff = cutoff
+        self.max_postings = max_postings
+        self.keys = []
+        self._key_ids = {}
+        self._key_tokens = []
+        self._postings = defaultdict(list)
+        # IDF和键的范数随键的数量变化，按需计算并缓存，添加键时清空
+        self._idf_cache = {}
+        self._norm_cache = {}
+        for key in keys:
+            self.add(key)
+
+    def to_state(self):
+        """导出为只包含内置类型的状态，便于写入快照"""
+        return {
+            'cutoff': self.cutoff,
+            'max_postings': self.max_postings,
+            'keys': self.keys,
+            'key_tokens': self._key_tokens,
+            'postings': dict(self._postings),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """从 to_state() 的结果恢复索引，无需重新切分"""
+        index = cls(cutoff=state['cutoff'], max_postings=state['max_postings'])
+        index.keys = state['keys']
+        index._key_ids = {key: key_id for key_id, key in enumerate(index.keys)}
+        index._key_tokens = state['key_tokens']
+        index._postings = defaultdict(list, state['postings'])
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._key_ids
+
+    def add(self, key):
+        """增量添加一个映射键"""
+        if key in self._key_ids:
+            return
+        key_id = len(self.keys)
+        self.keys.append(key)
+        self._key_ids[key] = key_id
+        tokens = tuple(tokenize(key))
+        self._key_tokens.append(tokens)
+        for token in tokens:
+            self._postings[token].append(key_id)
+        self._idf_cache.clear()
+        self._norm_cache.clear()
+
+    def _idf(self, token):
+        """词的IDF权重；索引中没有的词按只出现一次计算"""
+        idf = self._idf_cache.get(token)
+        if idf is None:
+            idf = math.log(1 + len(self.keys) / max(len(self._postings.get(token, ())), 1))
+            self._idf_cache[token] = idf
+        return idf
+
+    def _norm(self, key_id):
+        """键的词权重范数"""
+        norm = self._norm_cache.get(key_id)
+        if norm is None:
+            norm = math.sqrt(sum(self._idf(token) ** 2 for token in self._key_tokens[key_id]))
+            self._norm_cache[key_id] = norm
+        return norm
+
+    def scores(self, text):
+        """返回 {键: 得分}，只包含至少共享一个少见词的候选键"""
+        weights = {token: self._idf(token) for token in tokenize(text)}
+        if not weights or not self.keys:
+            return {}
+
+        shared = defaultdict(float)
+        common = []
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            if len(postings) > self.max_postings:
+                common.append(token)
+                continue
+            for key_id in postings:
+                shared[key_id] += weight * weight
+
+        # 只共享常见词时，从其中最少见的词收集候选
+        if not shared and common:
+            rarest = min(common, key=lambda token: len(self._postings[token]))
+            common.remove(rarest)
+            for key_id in self._postings[rarest]:
+                shared[key_id] += weights[rarest] * weights[rarest]
+
+        # 其余常见词只给已经是候选的键加分
+        for token in common:
+            weight = weights[token]
+            for key_id in shared:
+                if token in self._key_tokens[key_id]:
+                    shared[key_id] += weight * weight
+
+        query_norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        scores = {}
+        for key_id, dot in shared.items():
+            scores[self.keys[key_id]] = dot / (query_norm * self._norm(key_id))
+        return scores
+
+    def best_match(self, text):
+        """返回得分最高的映射键，没有达到阈值时返回None"""
+        best = None
+        for key, score in self.scores(text).items():
+            if score >= self.cutoff and (best is None or (score, key) > best):
+                best = (score, key)
+        return best[1] if best else None
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import tempfile
+import shutil
+import json
+from pathlib import Path
+
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bank_parser import BankParser, get_parser, registered_parsers
+from data_processor import DataProcessor
+
+class TestBankParser(unittest.TestCase):
+    """Test cases for the bank parser registry"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after each test method"""
+        shutil.rmtree(self.temp_dir)
+
+    def write_csv(self, filename, data):
+        path = Path(self.temp_dir) / filename
+        pd.DataFrame(data).to_csv(path, index=False)
+        return path
+
+    def test_registry_lookup(self):
+        """Test lookup by bank code, by name and by inline config"""
+        self.assertIn('anz', registered_parsers())
+        self.assertIs(get_parser('ANZ'), registered_parsers()['anz'])
+        self.assertIs(get_parser('amex'), registered_parsers()['generic'])
+        self.assertIs(get_parser('anzbiz', 'anz'), registered_parsers()['anz'])
+        self.assertIsInstance(get_parser('hsbc', {'columns': {'description': 'Details'}}), BankParser)
+        with self.assertRaises(ValueError):
+            get_parser('hsbc', 'no-such-parser')
+
+    def test_anz_debit_credit(self):
+        """Test that ANZ debit/credit columns are combined into a signed amount"""
+        path = self.write_csv('anz-202508.csv', {
+            'Transaction Date': ['01/08/2025', '02/08/2025', '03/08/2025'],
+            'Narrative': ['WOOLWORTHS', 'SALARY', 'EMPTY'],
+            'Debit': [50.0, None, None],
+            'Credit': [None, 1000.0, None],
+        })
+        df = BankParser.parse_anz(path)
+        self.assertEqual(list(df.columns), ['date', 'description', 'amount'])
+        self.assertEqual(df['amount'].tolist(), [-50.0, 1000.0, 0.0])
+
+    def test_westpac_memo_and_generic_headers(self):
+        """Test the Westpac memo column, falling back to generic headers"""
+        path = self.write_csv('westpac-202508.csv', {'Date': ['01/08/2025'], 'Memo': ['NETFLIX'], 'Amount': [-15.99]})
+        self.assertEqual(BankParser.parse_westpac(path)['description'].tolist(), ['NETFLIX'])
+
+        path = self.write_csv('westpac-202509.csv', {'date': ['01/09/2025'], 'description': ['UBER'], 'amount': [-20]})
+        self.assertEqual(BankParser.parse_westpac(path)['description'].tolist(), ['UBER'])
+
+    def test_missing_columns(self):
+        """Test that a file without the parser's columns is rejected"""
+        path = self.write_csv('anz-202508.csv', {'Transaction Date': ['01/08/2025'], 'Narrative': ['X']})
+        with self.assertRaises(ValueError) as context:
+            get_parser('anz').parse(path)
+        self.assertIn('Missing required columns in anz-202508.csv', str(context.exception))
+
+    def test_parser_declared_in_bank_config(self):
+        """Test that DataProcessor uses a parser declared in bank_config.json"""
+        config_file = Path(self.temp_dir) / 'bank_config.json'
+        config_file.write_text(json.dumps({
+            "hsbc": {
+                "name": "HSBC",
+                "date_format": "%Y-%m-%d",
+                "parser": {
+                    "columns": {"date": "Posted", "description": "Details"},
+                    "debit_column": "Withdrawal",
+                    "credit_column": "Deposit"
+                }
+            },
+            "anzbiz": {"name": "ANZ Business", "date_format": "%d/%m/%Y", "parser": "anz"}
+        }))
+        self.write_csv('hsbc-202508.csv', {
+            'Posted': ['2025-08-02', '2025-08-01'],
+            'Details': ['RENT', 'REFUND'],
+            'Withdrawal': [1500.0, None],
+            'Deposit': [None, 20.0],
+            'Balance': [0.0, 1500.0],
+        })
+        self.write_csv('anzbiz-202508.csv', {
+            'Transaction Date': ['03/08/2025'], 'Narrative': ['FEE'], 'Debit': [5.0], 'Credit': [None],
+        })
+
+        processor = DataProcessor(str(config_file))
+        monthly_data = processor.merge_files(self.temp_dir)
+        df = monthly_data['202508']
+        self.assertEqual(df['description'].tolist(), ['REFUND', 'RENT', 'FEE'])
+        self.assertEqual(df['amount'].tolist(), [20.0, -1500.0, -5.0])
+        self.assertEqual(df['bank'].tolist(), ['HSBC', 'HSBC', 'ANZ Business'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,8 @@ import json
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
 from category_manager import CategoryManager
+from fuzzy_index import FuzzyIndex
+from token_index import TokenIndex
 
 class TestCategoryManager(unittest.TestCase):
     """Test cases for CategoryManager class"""
@@ -65,6 +67,14 @@ class TestCategoryManager(unittest.TestCase):
         # Should match SUPERMARKET pattern
         self.assertEqual(self.cm.get_category("COLES SUPERMARKET"), "groceries")
     
+    def test_fuzzy_matching(self):
+        """Test fuzzy matching against mappings, including newly added ones"""
+        self.assertEqual(self.cm.get_category("MCDONALD'S 0401"), "fast food")
+        self.assertIsNone(self.cm.get_category("BUNNINGS 6438"))
+        
+        self.cm.add_mapping("BUNNINGS WAREHOUSE 6438", "home improvement")
+        self.assertEqual(self.cm.get_category("BUNNINGS 6438"), "home improvement")
+    
     def test_add_mapping(self):
         """Test adding new mappings"""
         self.cm.add_mapping("NEW MERCHANT", "shopping")
@@ -77,6 +87,83 @@ class TestCategoryManager(unittest.TestCase):
         self.assertIn("NEW MERCHANT", yaml_content)
         self.assertIn("shopping", yaml_content)
     
+    def test_add_invalid_regex_pattern(self):
+        """Test that invalid regex patterns are rejected when added"""
+        with self.assertRaises(ValueError):
+            self.cm.add_pattern("REGEX:[unclosed", "broken")
+        self.assertNotIn("REGEX:[unclosed", self.cm.patterns)
+        
+        self.cm.add_pattern("REGEX:^UBER\\s+EATS", "food delivery")
+        self.assertEqual(self.cm.get_category("UBER EATS SYDNEY"), "food delivery")
+    
+    def test_batch_defers_writes(self):
+        """Test that changes inside a batch are written once when it ends"""
+        original = self.mapping_file.read_text()
+        
+        with self.cm.batch():
+            self.cm.add_mapping("NEW MERCHANT 1", "shopping")
+            self.cm.add_mapping("NEW MERCHANT 2", "shopping")
+            self.cm.add_pattern("CONTAINS:NETFLIX", "entertainment")
+            self.assertEqual(self.mapping_file.read_text(), original)
+            self.assertEqual(self.cm.get_category("NEW MERCHANT 2"), "shopping")
+        
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file))
+        self.assertEqual(cm.get_exact_match("NEW MERCHANT 1"), "shopping")
+        self.assertEqual(cm.patterns["CONTAINS:NETFLIX"], "entertainment")
+    
+    def test_journal_replay_and_compaction(self):
+        """Test that journaled changes survive a restart and fold into the YAML"""
+        original = self.mapping_file.read_text()
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file), journal=True)
+        cm.add_mapping("NEW MERCHANT", "shopping")
+        cm.add_pattern("CONTAINS:NETFLIX", "entertainment")
+        
+        # Only the journal was written; simulate a crash that left a partial record
+        self.assertEqual(self.mapping_file.read_text(), original)
+        with open(cm.journal_file, 'a') as f:
+            f.write('{"type": "mapping", "descr')
+        
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file), journal=True)
+        self.assertEqual(cm.get_exact_match("NEW MERCHANT"), "shopping")
+        self.assertEqual(cm.get_category("NETFLIX MONTHLY"), "entertainment")
+        
+        cm.compact_journal()
+        self.assertFalse(cm.journal_file.exists())
+        self.assertIn('"NEW MERCHANT"', self.mapping_file.read_text())
+    
+    def test_journal_compacts_past_threshold(self):
+        """Test automatic compaction when the journal grows past its size limit"""
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file),
+            journal=True, journal_compact_bytes=200
+        )
+        for i in range(5):
+            cm.add_mapping(f"MERCHANT {i}", "shopping")
+        
+        self.assertIn('"MERCHANT 0"', self.mapping_file.read_text())
+        self.assertLess(cm.journal_file.stat().st_size if cm.journal_file.exists() else 0, 200)
+    
+    def test_mapping_snapshot(self):
+        """Test that the binary snapshot is used while the YAML is unchanged"""
+        snapshot_file = self.cm.snapshot_file
+        self.assertTrue(snapshot_file.exists())
+        
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file))
+        self.assertEqual(cm.mapping, self.cm.mapping)
+        self.assertEqual(cm.get_category("MCDONALD'S 0401"), "fast food")
+        
+        # Hand edits to the YAML make the snapshot stale
+        with open(self.mapping_file, 'a') as f:
+            f.write('- shopping\n  - "KMART"\n')
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file))
+        self.assertEqual(cm.get_exact_match("KMART"), "shopping")
+        self.assertEqual(cm.get_category("KMART 1234"), "shopping")
+        
+        # A corrupt snapshot is ignored and rebuilt
+        snapshot_file.write_bytes(b'not a pickle')
+        cm = CategoryManager(mapping_file=str(self.mapping_file), patterns_file=str(self.patterns_file))
+        self.assertEqual(cm.get_exact_match("KMART"), "shopping")
+    
     def test_get_exact_match(self):
         """Test exact match retrieval for learning mode"""
         self.assertEqual(self.cm.get_exact_match("WOOLWORTHS"), "groceries")
@@ -99,6 +186,283 @@ class TestCategoryManager(unittest.TestCase):
         self.assertEqual(result_df.loc[1, 'comment'], 'fast food')
         self.assertIsNone(result_df.loc[2, 'comment'])  # Unknown should be None
     
+    def test_apply_categories_matches_get_category(self):
+        """Test that batch categorization agrees with row-by-row get_category"""
+        self.cm.add_pattern("CONTAINS:NETFLIX", "entertainment")
+        descriptions = [
+            'WOOLWORTHS', 'WOOLWORTHS', 'NETFLIX MONTHLY', 'COLES SUPERMARKET',
+            'STARBUCKS CAFE', 'UBER TRIP', "MCDONALD'S 0401", 'UNKNOWN PLACE', 'WOOLWORTHS'
+        ]
+        test_data = pd.DataFrame({'description': descriptions})
+        
+        result_df = self.cm.apply_categories(test_data)
+        
+        expected = [self.cm.get_category(desc) for desc in descriptions]
+        self.assertEqual(result_df['comment'].tolist(), expected)
+    
+    def test_category_cache(self):
+        """Test LRU cache hits and invalidation on mapping changes"""
+        self.assertIsNone(self.cm.get_category("BUNNINGS 6438"))
+        self.assertIsNone(self.cm.get_category("BUNNINGS 6438"))
+        stats = self.cm.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        
+        # Adding a mapping bumps the version, so the cached None is dropped
+        self.cm.add_mapping("BUNNINGS WAREHOUSE 6438", "home improvement")
+        self.assertEqual(self.cm.get_category("BUNNINGS 6438"), "home improvement")
+        self.assertEqual(self.cm.cache_stats()['misses'], 2)
+    
+    def test_snapshot(self):
+        """Test that a pickled snapshot categorizes exactly like the manager"""
+        import pickle
+        
+        descriptions = pd.Series(["WOOLWORTHS", "WOOLWORTH", "STARBUCKS COFFEE", "UNKNOWN PLACE", None, "WOOLWORTH"])
+        self.cm.get_category("UNKNOWN PLACE")  # Cached results travel with the snapshot
+        snapshot = pickle.loads(pickle.dumps(self.cm.snapshot()))
+        self.assertIn("UNKNOWN PLACE", snapshot.cached)
+        
+        expected = self.cm.categorize_series(descriptions)
+        pd.testing.assert_series_equal(snapshot.categorize_series(descriptions), expected)
+        self.assertEqual(expected.tolist(), ["groceries", "groceries", "coffee", None, None, "groceries"])
+    
+    def test_persistent_cache(self):
+        """Test that the on-disk cache is reused only for identical mappings and patterns"""
+        cache_file = Path(self.temp_dir) / 'category_cache.json'
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            cache_file=str(cache_file)
+        )
+        cm.apply_categories(pd.DataFrame({'description': ['WOOLWORTH', 'UNKNOWN PLACE']}))
+        cm.save_cache()
+        
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            cache_file=str(cache_file)
+        )
+        self.assertEqual(cm.cache_stats()['size'], 2)
+        self.assertEqual(cm.get_category('WOOLWORTH'), 'groceries')
+        self.assertEqual(cm.cache_stats()['hits'], 1)
+        
+        # A changed pattern file produces a different key, so the cache is ignored
+        cm.add_pattern("CONTAINS:UNKNOWN", "misc")
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            cache_file=str(cache_file)
+        )
+        self.assertEqual(cm.cache_stats()['size'], 0)
+    
+    def test_normalized_matching(self):
+        """Test exact and fuzzy matching on normalized descriptions"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        self.cm.add_mapping("SHANGHAI SUPERMARKET CARNEGIE AUS Card xx2644 Value Date: 05/07/2025", "asian grocery")
+        self.cm.add_mapping("DIRECT DEBIT 000187 CBHS 10134206", "health")
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        
+        descriptions = pd.Series([
+            "Shanghai Supermarket Carnegie AUS Card xx9911 Value Date: 14/08/2025",
+            "DIRECT DEBIT 000187 CBHS 10135104",
+            "DIRECT DEBT CBHS 99",
+            "Woolworths",
+        ])
+        # Normalized exact matches win over pattern matches (SUPERMARKET -> groceries)
+        expected = ["asian grocery", "health", "health", "groceries"]
+        self.assertEqual(cm.categorize_series(descriptions).tolist(), expected)
+        self.assertEqual([cm.get_category(description) for description in descriptions], expected)
+        self.assertEqual(cm.snapshot().categorize_series(descriptions).tolist(), expected)
+        self.assertEqual(cm.get_exact_matches(descriptions).tolist()[:2], expected[:2])
+        
+        # Without a normalization config nothing changes: no exact hit, the pattern gives groceries
+        self.assertEqual(self.cm.get_category(descriptions[0]), "groceries")
+        self.assertIsNone(self.cm.get_exact_match(descriptions[0]))
+        
+        # A new mapping drops older aliases with the same category, so the mapping does not grow
+        size = len(cm.mapping)
+        cm.add_mapping("DIRECT DEBIT 000190 CBHS 10200000", "health")
+        self.assertEqual(len(cm.mapping), size)
+        self.assertNotIn("DIRECT DEBIT 000187 CBHS 10134206", cm.mapping)
+        
+        # Aliases with a different category are kept and still match exactly,
+        # but their normalized key is ambiguous and no longer categorizes other variants
+        cm.add_mapping("DIRECT DEBIT 000191 CBHS 10300000", "insurance")
+        self.assertEqual(len(cm.mapping), size + 1)
+        self.assertIn("DIRECT DEBIT 000190 CBHS 10200000", cm.mapping)
+        self.assertEqual(cm.get_category("DIRECT DEBIT 000190 CBHS 10200000"), "health")
+        self.assertEqual(cm.get_category("DIRECT DEBIT 000191 CBHS 10300000"), "insurance")
+        self.assertIsNone(cm.get_category("DIRECT DEBIT 000187 CBHS 10135104"))
+        self.assertEqual(cm.categorize_series(pd.Series(["DIRECT DEBIT 000187 CBHS 10135104"])).tolist(), [None])
+        self.assertIn("DIRECT DEBIT 000190 CBHS 10200000", self.mapping_file.read_text())
+    
+    def test_normalized_aliases_after_journal_replay(self):
+        """Test that replaying the journal keeps aliases and gives the same categories"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        with self.cm.batch():
+            self.cm.add_mapping("TRANSFER TO 123456", "rent")
+            self.cm.add_mapping("TRANSFER TO 789012", "savings")
+        
+        def open_manager():
+            return CategoryManager(
+                mapping_file=str(self.mapping_file),
+                patterns_file=str(self.patterns_file),
+                matching_file=str(matching_file),
+                journal=True
+            )
+        
+        cm = open_manager()
+        cm.add_mapping("TRANSFER TO 555", "misc")
+        cm.add_mapping("TRANSFER TO 777", "misc")
+        self.assertIsNone(cm.get_category("TRANSFER TO 999"))
+        live_mapping = dict(cm.mapping)
+        
+        # Restart without compacting: the journal is replayed through the same path
+        cm = open_manager()
+        self.assertEqual(cm.mapping, live_mapping)
+        self.assertIn("TRANSFER TO 123456", cm.mapping)
+        self.assertIn("TRANSFER TO 789012", cm.mapping)
+        self.assertNotIn("TRANSFER TO 555", cm.mapping)
+        self.assertIsNone(cm.get_category("TRANSFER TO 999"))
+        self.assertEqual(cm.get_category("TRANSFER TO 123456"), "rent")
+    
+    def test_normalized_conflicts_survive_yaml_round_trip(self):
+        """Test that conflicting aliases categorize the same live, from the snapshot and from the YAML"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        
+        def open_manager():
+            return CategoryManager(
+                mapping_file=str(self.mapping_file),
+                patterns_file=str(self.patterns_file),
+                matching_file=str(matching_file)
+            )
+        
+        cm = open_manager()
+        cm.add_mapping("DIRECT DEBIT 111 CBHS", "zeta")
+        cm.add_mapping("DIRECT DEBIT 222 CBHS", "alpha")
+        cm.add_mapping("WOOLWORTHS 3133", "groceries")
+        descriptions = ["DIRECT DEBIT 999 CBHS", "DIRECT DEBIT 111 CBHS", "WOOLWORTHS 4000"]
+        expected = [None, "zeta", "groceries"]
+        self.assertEqual([cm.get_category(description) for description in descriptions], expected)
+        
+        # Reloaded from the snapshot, then rebuilt from the YAML after deleting the snapshot
+        self.assertEqual([open_manager().get_category(description) for description in descriptions], expected)
+        cm.snapshot_file.unlink()
+        cm = open_manager()
+        self.assertEqual([cm.get_category(description) for description in descriptions], expected)
+        self.assertEqual(cm.categorize_series(pd.Series(descriptions)).tolist(), expected)
+    
+    def test_snapshot_keeps_normalized_index(self):
+        """Test that the normalized index is loaded from the snapshot instead of rebuilt"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        self.cm.add_mapping("DIRECT DEBIT 000187 CBHS 10134206", "health")
+        
+        def open_manager():
+            return CategoryManager(
+                mapping_file=str(self.mapping_file),
+                patterns_file=str(self.patterns_file),
+                matching_file=str(matching_file)
+            )
+        
+        open_manager()
+        cm = open_manager()
+        self.assertIsNotNone(cm._normalized_index)
+        self.assertEqual(cm.get_category("DIRECT DEBIT 000190 CBHS 10200000"), "health")
+        
+        # Without normalization the snapshot is rebuilt and holds no normalized index
+        matching_file.write_text(json.dumps({'normalization': {'enabled': False}}))
+        cm = open_manager()
+        self.assertIsNone(cm._normalized_index)
+    
+    def test_merge_normalized_duplicates(self):
+        """Test collapsing mapping keys that only differ in volatile parts"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        with self.cm.batch():
+            self.cm.add_mapping("WOOLWORTHS 3133", "groceries")
+            self.cm.add_mapping("STARBUCKS #12", "snacks")
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        
+        # WOOLWORTHS 3133 has the same category as WOOLWORTHS and is merged; the STARBUCKS entries differ and are kept
+        self.assertEqual(cm.merge_normalized_duplicates(), 1)
+        self.assertEqual(sorted(cm.mapping), ["MCDONALD'S", "STARBUCKS", "STARBUCKS #12", "WOOLWORTHS"])
+        self.assertNotIn("WOOLWORTHS 3133", self.mapping_file.read_text())
+        
+        # Changing the normalization rules rebuilds the fuzzy index in the snapshot
+        matching_file.write_text(json.dumps({'normalization': {'enabled': False}}))
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        self.assertIn("STARBUCKS #12", cm.fuzzy_index)
+    
+    def test_token_fuzzy_method(self):
+        """Test selecting the token index as the fuzzy matching stage"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'fuzzy': {'method': 'token', 'cutoff': 0.5}}))
+        self.cm.add_mapping("BUNNINGS WAREHOUSE OAKLEIGH SOUTH", "home")
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        self.assertIsInstance(cm.fuzzy_index, TokenIndex)
+        self.assertEqual(cm.get_category("BUNNINGS WAREHOUSE NUNAWADING"), "home")
+        
+        # The snapshot stores the token index, so reloading restores it directly
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        self.assertIsInstance(cm.fuzzy_index, TokenIndex)
+        self.assertIn("BUNNINGS WAREHOUSE OAKLEIGH SOUTH", cm.fuzzy_index)
+        self.assertEqual(cm.snapshot().categorize_series(pd.Series(["BUNNINGS WAREHOUSE NUNAWADING"])).tolist(), ["home"])
+        
+        # Switching back to difflib invalidates the snapshot and rebuilds the index
+        matching_file.write_text(json.dumps({'fuzzy': {'method': 'difflib'}}))
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        self.assertIsInstance(cm.fuzzy_index, FuzzyIndex)
+        
+        matching_file.write_text(json.dumps({'fuzzy': {'method': 'soundex'}}))
+        with self.assertRaises(ValueError):
+            CategoryManager(
+                mapping_file=str(self.mapping_file),
+                patterns_file=str(self.patterns_file),
+                matching_file=str(matching_file)
+            )
+    
+    def test_combine_regex_from_matching_config(self):
+        """Test enabling the combined regex alternation from matching.json"""
+        self.patterns_file.write_text(json.dumps({"REGEX:^PAYPAL \\*": "online", "REGEX:UBER\\s+EATS": "takeaway"}))
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'patterns': {'combine_regex': True}}))
+        cm = CategoryManager(
+            mapping_file=str(self.mapping_file),
+            patterns_file=str(self.patterns_file),
+            matching_file=str(matching_file)
+        )
+        self.assertTrue(cm.combine_regex)
+        self.assertIsNotNone(cm.pattern_matcher.combined_regex)
+        self.assertEqual(cm.get_category("UBER  EATS SYDNEY"), "takeaway")
+        self.assertFalse(self.cm.combine_regex)
+    
     def test_get_unmapped_descriptions(self):
         """Test getting unmapped descriptions"""
         test_data = pd.DataFrame({
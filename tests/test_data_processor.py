@@ -9,7 +9,8 @@ import json
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from data_processor import DataProcessor
+from data_processor import DataProcessor, PYARROW_AVAILABLE
+from category_manager import CategoryManager
 
 class TestDataProcessor(unittest.TestCase):
     """Test cases for DataProcessor class"""
@@ -106,6 +107,55 @@ class TestDataProcessor(unittest.TestCase):
         # Original amounts are negative, should be made positive
         self.assertTrue(all(df['amount'] > 0))
     
+    def test_parse_dates(self):
+        """Test unique-value date parsing, format detection and caching"""
+        dates = pd.Series(['01/08/2025', '02/08/2025', None, '01/08/2025'])
+        parsed = self.processor.parse_dates(dates, 'cba', {'date_format': '%d/%m/%Y'})
+        expected = pd.to_datetime(dates, format='%d/%m/%Y')
+        pd.testing.assert_series_equal(parsed, expected)
+        
+        # Without date_format the format is detected; day/month ambiguity is resolved by the file month
+        parsed = self.processor.parse_dates(pd.Series(['01/02/2025', '03/02/2025']), 'bom', {}, '2025-02')
+        self.assertEqual(list(parsed.dt.day), [1, 3])
+        self.assertEqual(self.processor.date_formats['bom'], '%d/%m/%Y')
+        parsed = self.processor.parse_dates(pd.Series(['2025-01-02']), 'anz', {}, '2025-01')
+        self.assertEqual(self.processor.date_formats['anz'], '%Y-%m-%d')
+        
+        # The cached format is reused for the same bank
+        parsed = self.processor.parse_dates(pd.Series(['05/06/2025']), 'bom', {}, '2025-05')
+        self.assertEqual(parsed.iloc[0], pd.Timestamp('2025-06-05'))
+        
+        with self.assertRaises(ValueError):
+            self.processor.parse_dates(pd.Series(['not a date']), 'westpac', {})
+        
+        stats = self.processor.date_parse_stats()
+        self.assertEqual(stats['cba']['rows'], 4)
+        self.assertEqual(stats['cba']['unique'], 2)
+        self.assertEqual(stats['bom']['format'], '%d/%m/%Y')
+    
+    def test_read_spec(self):
+        """Test column pruning and pinned dtypes when reading statements"""
+        export_path = Path(self.temp_dir) / 'amex-202510.csv'
+        pd.DataFrame({
+            'Date': ['01/10/2025', '02/10/2025'],
+            'Reference': ['0001', '0002'],
+            'Description': ['NETFLIX', '12345'],
+            'Amount': [15, 20],
+            'Balance': [100.0, 80.0],
+        }).to_csv(export_path, index=False)
+        
+        read_kwargs = self.processor._read_spec(str(export_path), {})
+        self.assertEqual(read_kwargs['usecols'], ['Date', 'Description', 'Amount'])
+        
+        df = self.processor.load_and_process_file(str(export_path))
+        self.assertEqual(list(df.columns), ['date', 'description', 'amount', 'bank', 'month'])
+        self.assertEqual(df['amount'].dtype, 'float64')
+        self.assertEqual(df['description'].tolist(), ['NETFLIX', '12345'])  # Never inferred as numbers
+        
+        self.processor.bank_config['amex']['read'] = {'description_dtype': 'category'}
+        df = self.processor.load_and_process_file(str(export_path))
+        self.assertIsInstance(df['description'].dtype, pd.CategoricalDtype)
+    
     def test_merge_files(self):
         """Test merging multiple bank files"""
         monthly_data = self.processor.merge_files(self.temp_dir)
@@ -126,6 +176,244 @@ class TestDataProcessor(unittest.TestCase):
         # Should be sorted by date
         self.assertTrue(df['date'].is_monotonic_increasing)
     
+    def test_merge_files_parallel(self):
+        """Test that parallel ingest gives the same result as sequential ingest"""
+        # A broken file must still be reported without stopping the others
+        bad_path = Path(self.temp_dir) / 'amex-202509.csv'
+        pd.DataFrame({'Date': ['01/09/2025'], 'Memo': ['NO DESCRIPTION COLUMN']}).to_csv(bad_path, index=False)
+        # A bank without date_format, so the format is detected in the worker
+        pd.DataFrame({'Date': ['2025-08-05'], 'Description': ['BAKERY'], 'Amount': [4.5]}).to_csv(
+            Path(self.temp_dir) / 'bom-202508.csv', index=False)
+        
+        expected = self.processor.merge_files(self.temp_dir)
+        for pool in ('thread', 'process'):
+            processor = DataProcessor(str(self.config_file))
+            monthly_data = processor.merge_files(self.temp_dir, workers=3, pool=pool)
+            self.assertEqual(list(monthly_data.keys()), list(expected.keys()))
+            for month in expected:
+                pd.testing.assert_frame_equal(monthly_data[month], expected[month])
+            # Date parse timings from worker processes are merged back
+            self.assertEqual(processor.date_parse_stats().keys(), self.processor.date_parse_stats().keys())
+            self.assertEqual(processor.date_parse_stats()['cba']['rows'], 2)
+            self.assertEqual(processor.date_formats['bom'], '%Y-%m-%d')
+    
+    def test_merge_files_selected_months(self):
+        """Test that month selection skips other months' files before reading them"""
+        # An unreadable file for another month must not even be opened
+        other_month = Path(self.temp_dir) / 'amex-202509.csv'
+        other_month.write_text('not,a\nvalid "statement')
+        
+        loaded = []
+        original_load = self.processor.load_and_process_file
+        def tracking_load(file_path):
+            loaded.append(Path(file_path).name)
+            return original_load(file_path)
+        self.processor.load_and_process_file = tracking_load
+        
+        monthly_data = self.processor.merge_files(self.temp_dir, months=['202508'])
+        self.assertEqual(list(monthly_data.keys()), ['202508'])
+        self.assertEqual(sorted(loaded), ['amex-202508.csv', 'cba-202508.csv'])
+    
+    def test_merge_files_partitioned_by_month(self):
+        """Test that per-month merging matches a global stable sort followed by groupby"""
+        for bank, month, days in [('cba', '202507', [3, 1, 3]), ('amex', '202507', [1, 3, 2]), ('cba', '202509', [9, 2])]:
+            pd.DataFrame({
+                'Date': [f'{day:02d}/{month[4:]}/{month[:4]}' for day in days],
+                'Description': [f'{bank.upper()} {month} ROW {i}' for i in range(len(days))],
+                'Amount': [float(day) for day in days],
+            }).to_csv(Path(self.temp_dir) / f'{bank}-{month}.csv', index=False)
+        
+        file_paths = list(Path(self.temp_dir).glob('*.csv'))
+        frames = [self.processor.load_and_process_file(str(path)) for path in file_paths]
+        merged = pd.concat(frames, ignore_index=True).sort_values('date', kind='stable', ignore_index=True)
+        expected = {
+            month.replace('-', ''): group.reset_index(drop=True) for month, group in merged.groupby('month')
+        }
+        
+        for workers in (1, 4):
+            monthly_data = self.processor.merge_files(self.temp_dir, workers=workers)
+            self.assertEqual(list(monthly_data), ['202507', '202508', '202509'])
+            for month, df in expected.items():
+                pd.testing.assert_frame_equal(monthly_data[month], df)
+    
+    def test_list_months(self):
+        """Test listing months from filenames and row counts only"""
+        pd.DataFrame({
+            'Date': ['01/09/2025'], 'Description': ['NETFLIX'], 'Amount': [15.99]
+        }).to_csv(Path(self.temp_dir) / 'amex-202509.csv', index=False)
+        
+        months = self.processor.list_months(self.temp_dir)
+        self.assertEqual(list(months.keys()), ['202508', '202509'])
+        self.assertEqual(months['202508']['transactions'], 4)
+        self.assertEqual(sorted(months['202508']['banks']), ['American Express', 'Commonwealth Bank'])
+        self.assertEqual(months['202509'], {'transactions': 1, 'banks': ['American Express']})
+        self.assertEqual(self.processor.available_months(self.temp_dir), ['202508', '202509'])
+    
+    def test_incremental_manifest(self):
+        """Test that unchanged files and output months are skipped on later runs"""
+        cache_dir = Path(self.temp_dir) / 'cache'
+        output_dir = Path(self.temp_dir) / 'output'
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        expected = processor.merge_files(self.temp_dir)
+        fingerprints = {month: processor.month_fingerprint(month, 'mapping-v1') for month in expected}
+        self.assertEqual(len(processor.save_monthly_files(expected, str(output_dir), fingerprints)), 1)
+        
+        # Second run: nothing is re-parsed and the unchanged month is not rewritten
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        processor.load_and_process_file = None  # Any re-parse would fail
+        monthly_data = processor.merge_files(self.temp_dir)
+        pd.testing.assert_frame_equal(monthly_data['202508'], expected['202508'])
+        fingerprints = {month: processor.month_fingerprint(month, 'mapping-v1') for month in monthly_data}
+        self.assertEqual(processor.save_monthly_files(monthly_data, str(output_dir), fingerprints), [])
+        
+        # A changed mapping hash or a changed input file forces the month to be written again
+        fingerprints = {month: processor.month_fingerprint(month, 'mapping-v2') for month in monthly_data}
+        self.assertEqual(len(processor.save_monthly_files(monthly_data, str(output_dir), fingerprints)), 1)
+        
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        with open(Path(self.temp_dir) / 'amex-202508.csv', 'a') as f:
+            f.write('05/08/2025,NETFLIX,15.99\n')
+        monthly_data = processor.merge_files(self.temp_dir)
+        self.assertEqual(len(monthly_data['202508']), 5)
+        fingerprints = {month: processor.month_fingerprint(month, 'mapping-v2') for month in monthly_data}
+        self.assertEqual(len(processor.save_monthly_files(monthly_data, str(output_dir), fingerprints)), 1)
+        
+        # A changed bank config re-parses the file and rewrites the month with the new signs
+        config = json.loads(self.config_file.read_text())
+        config['amex']['revert_amount'] = True
+        self.config_file.write_text(json.dumps(config))
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        monthly_data = processor.merge_files(self.temp_dir)
+        fingerprints = {month: processor.month_fingerprint(month, 'mapping-v2') for month in monthly_data}
+        self.assertEqual(len(processor.save_monthly_files(monthly_data, str(output_dir), fingerprints)), 1)
+        output = pd.read_csv(output_dir / '202508.csv')
+        self.assertAlmostEqual(output.loc[output['description'] == 'NETFLIX', 'amount'].iloc[0], -15.99)
+    
+    def test_incremental_manifest_pruning(self):
+        """Test that cache entries for deleted inputs and stray result files are removed"""
+        cache_dir = Path(self.temp_dir) / 'cache'
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        processor.merge_files(self.temp_dir)
+        self.assertEqual(len(list((cache_dir / 'files').glob('*.pkl'))), 2)
+        (cache_dir / 'files' / 'stale.pkl').write_bytes(b'')
+        
+        (Path(self.temp_dir) / 'amex-202508.csv').unlink()
+        processor = DataProcessor(str(self.config_file), cache_dir=str(cache_dir))
+        processor.merge_files(self.temp_dir)
+        manifest = json.loads((cache_dir / 'manifest.json').read_text())
+        self.assertEqual([Path(key).name for key in manifest['files']], ['cba-202508.csv'])
+        self.assertEqual(len(list((cache_dir / 'files').glob('*.pkl'))), 1)
+    
+    def test_stream_monthly_files(self):
+        """Test that streaming mode writes the same bytes as the in-memory pipeline"""
+        with open(self.config_file) as f:
+            config = json.load(f)
+        config['timed'] = {"name": "Timed Bank", "date_format": "%d/%m/%Y %H:%M:%S.%f"}
+        with open(self.config_file, 'w') as f:
+            json.dump(config, f)
+        
+        # Same-day ties across files, quoting, missing amounts and sub-second times
+        pd.DataFrame({
+            'Date': ['03/08/2025', '01/08/2025', '03/08/2025', '02/08/2025', '01/08/2025'],
+            'Description': ['SHOP, "QUOTED"', 'WOOLWORTHS 123', 'STARBUCKS', 'UNKNOWN', 'COLES'],
+            'Amount': [-1.5, -2.0, None, -10.25, -3.0],
+        }).to_csv(Path(self.temp_dir) / 'cba-202508.csv', index=False)
+        pd.DataFrame({
+            'Date': ['02/09/2025 10:00:00.250', '01/09/2025 09:30:00.000', '02/09/2025 10:00:00.250'],
+            'Description': ['UBER TRIP', 'SALARY', 'UBER EATS'],
+            'Amount': [12.0, 1000.0, 30.0],
+        }).to_csv(Path(self.temp_dir) / 'timed-202509.csv', index=False)
+        (Path(self.temp_dir) / 'broken-202508.csv').write_text('Date,Description\n01/08/2025,MISSING AMOUNT\n')
+        # Fails only in its second chunk: the rows already streamed must be discarded too
+        (Path(self.temp_dir) / 'westpac-202508.csv').write_text(
+            'Date,Description,Amount\n2025-08-01,A,1\n2025-08-02,B,2\nnot a date,C,3\n'
+        )
+        
+        mapping_file = Path(self.temp_config_dir) / 'category_mapping.json'
+        patterns_file = Path(self.temp_config_dir) / 'pattern_mapping.json'
+        mapping_file.write_text(json.dumps({"STARBUCKS": "coffee"}))
+        patterns_file.write_text(json.dumps({"UBER EATS": "food delivery"}))
+        cm = CategoryManager(mapping_file=str(mapping_file), patterns_file=str(patterns_file), snapshot=False)
+        
+        processor = DataProcessor(str(self.config_file))
+        expected_dir = Path(self.temp_config_dir) / 'expected'
+        monthly_data = processor.merge_files(self.temp_dir)
+        monthly_data = {month: cm.apply_categories(df) for month, df in monthly_data.items()}
+        expected_files = processor.save_monthly_files(monthly_data, str(expected_dir))
+        
+        stream_dir = Path(self.temp_config_dir) / 'stream'
+        saved_files, counts = processor.stream_monthly_files(cm, self.temp_dir, str(stream_dir), chunksize=2)
+        
+        self.assertEqual(counts, {'202508': 7, '202509': 3})
+        self.assertEqual([Path(f).name for f in saved_files], [Path(f).name for f in expected_files])
+        for expected_file, saved_file in zip(expected_files, saved_files):
+            self.assertEqual(Path(saved_file).read_bytes(), Path(expected_file).read_bytes())
+        # No run files are left behind
+        self.assertEqual(sorted(p.name for p in stream_dir.iterdir()), ['202508.csv', '202509.csv'])
+        
+        # Many runs merged a few at a time over several passes give the same bytes
+        stream_dir = Path(self.temp_config_dir) / 'stream-passes'
+        saved_files, _ = processor.stream_monthly_files(cm, self.temp_dir, str(stream_dir), chunksize=1, merge_fan_in=2)
+        for expected_file, saved_file in zip(expected_files, saved_files):
+            self.assertEqual(Path(saved_file).read_bytes(), Path(expected_file).read_bytes())
+        self.assertEqual(sorted(p.name for p in stream_dir.iterdir()), ['202508.csv', '202509.csv'])
+    
+    @unittest.skipUnless(PYARROW_AVAILABLE, "pyarrow is not installed")
+    def test_columnar_output(self):
+        """Test Parquet/Feather monthly files and the partitioned dataset keep column types"""
+        monthly_data = self.processor.merge_files(self.temp_dir)
+        monthly_data['202508']['comment'] = ['groceries', None, 'coffee', None]
+        monthly_data['202509'] = monthly_data['202508'].head(1).assign(month='2025-09')
+        output_dir = Path(self.temp_dir) / 'output'
+        
+        for output_format in ('parquet', 'feather'):
+            saved_files = self.processor.save_monthly_files(monthly_data, str(output_dir), output_format=output_format)
+            self.assertEqual([Path(f).name for f in saved_files], [f'202508.{output_format}', f'202509.{output_format}'])
+            df = pd.read_parquet(saved_files[0]) if output_format == 'parquet' else pd.read_feather(saved_files[0])
+            self.assertEqual(list(df.columns), ['date', 'description', 'amount', 'category', 'bank', 'comment'])
+            self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['date']))
+            self.assertEqual(df['amount'].dtype, 'float64')
+            self.assertIsInstance(df['category'].dtype, pd.CategoricalDtype)
+            self.assertEqual(df['category'].iloc[0], 'groceries')
+            self.assertTrue(pd.isna(df['category'].iloc[1]))
+        
+        dataset_dir = Path(self.temp_dir) / 'dataset'
+        self.processor.save_dataset(monthly_data, str(dataset_dir))
+        self.assertTrue((dataset_dir / 'month=202508' / 'part-0.parquet').exists())
+        df = DataProcessor.load_dataset(str(dataset_dir))
+        self.assertEqual(len(df), 5)
+        df = DataProcessor.load_dataset(str(dataset_dir), months=['202509'])
+        self.assertEqual(df['month'].tolist(), ['202509'])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['date']))
+        
+        # Months with more than 127 categories still load together with small months
+        large = pd.concat([monthly_data['202508']] * 50, ignore_index=True).assign(month='2025-10')
+        large['comment'] = [f'category {number}' for number in range(len(large))]
+        self.processor.save_dataset({'202510': large}, str(dataset_dir))
+        df = DataProcessor.load_dataset(str(dataset_dir))
+        self.assertEqual(len(df), 205)
+        self.assertIsInstance(df['category'].dtype, pd.CategoricalDtype)
+        
+        with self.assertRaises(ValueError):
+            self.processor.save_dataset(monthly_data, str(dataset_dir), output_format='csv')
+    
+    def test_save_monthly_files_concurrent(self):
+        """Test that concurrent writes produce the same files without touching the input frames"""
+        monthly_data = self.processor.merge_files(self.temp_dir)
+        monthly_data['202509'] = monthly_data['202508'].assign(month='2025-09')
+        monthly_data['202508']['comment'] = ['groceries', None, 'coffee', None]
+        before = {month: df.copy() for month, df in monthly_data.items()}
+        
+        sequential = self.processor.save_monthly_files(monthly_data, str(Path(self.temp_dir) / 'sequential'))
+        concurrent = self.processor.save_monthly_files(
+            monthly_data, str(Path(self.temp_dir) / 'concurrent'), write_workers=4
+        )
+        self.assertEqual([Path(f).name for f in concurrent], ['202508.csv', '202509.csv'])
+        for sequential_file, concurrent_file in zip(sequential, concurrent):
+            self.assertEqual(Path(sequential_file).read_bytes(), Path(concurrent_file).read_bytes())
+        for month, df in monthly_data.items():
+            pd.testing.assert_frame_equal(df, before[month])
+    
     def test_save_monthly_files(self):
         """Test saving monthly files with correct format"""
         # Create test data
@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+import stat
+from pathlib import Path
+import tempfile
+import shutil
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from file_utils import atomic_open
+
+class TestAtomicOpen(unittest.TestCase):
+    """Test cases for atomic_open"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.target = Path(self.temp_dir) / 'category_mapping.yml'
+        self.target.write_text('- groceries\n  - "WOOLWORTHS"\n', encoding='utf-8')
+
+    def tearDown(self):
+        """Clean up after each test method"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_replaces_file(self):
+        """Test that a completed write replaces the target"""
+        with atomic_open(self.target) as f:
+            f.write('- coffee\n')
+        self.assertEqual(self.target.read_text(encoding='utf-8'), '- coffee\n')
+        self.assertEqual(list(Path(self.temp_dir).iterdir()), [self.target])
+
+    def test_failed_write_keeps_original(self):
+        """Test that an error while writing leaves the original file intact"""
+        with self.assertRaises(RuntimeError):
+            with atomic_open(self.target) as f:
+                f.write('- half written')
+                raise RuntimeError("crash in the middle of a batch")
+
+        self.assertEqual(self.target.read_text(encoding='utf-8'), '- groceries\n  - "WOOLWORTHS"\n')
+        self.assertEqual(list(Path(self.temp_dir).iterdir()), [self.target])
+
+    def test_keeps_file_mode(self):
+        """Test that replacing a file keeps its permissions and new files get the umask default"""
+        self.target.chmod(0o644)
+        with atomic_open(self.target) as f:
+            f.write('- coffee\n')
+        self.assertEqual(stat.S_IMODE(self.target.stat().st_mode), 0o644)
+
+        umask = os.umask(0o022)
+        os.umask(umask)
+        new_file = Path(self.temp_dir) / 'pattern_mapping.json'
+        with atomic_open(new_file) as f:
+            f.write('{}')
+        self.assertEqual(stat.S_IMODE(new_file.stat().st_mode), 0o666 & ~umask)
+
+if __name__ == '__main__':
+    unittest.main()
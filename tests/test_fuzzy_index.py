@@ -0,0 +1,64 @@
+import unittest
+import sys
+import difflib
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from fuzzy_index import FuzzyIndex
+
+class TestFuzzyIndex(unittest.TestCase):
+    """Test cases for FuzzyIndex class"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.keys = [
+            "WOOLWORTHS 3153 GLEN HU GLENHUNTLY",
+            "STARBUCKS COFFEE MELBOURNE",
+            "MCDONALD'S 0401 ORMOND",
+            "BUNNINGS WAREHOUSE 6438 OAKLEIGH SOUTH",
+            "NETFLIX MONTHLY",
+        ]
+
+    def difflib_match(self, text, keys):
+        matches = difflib.get_close_matches(text, keys, n=1, cutoff=0.6)
+        return matches[0] if matches else None
+
+    def test_small_index_matches_difflib(self):
+        """Test that small mappings give exactly the difflib result"""
+        index = FuzzyIndex(self.keys)
+        queries = [
+            "WOOLWORTHS 3133 GLEN HU GLENHUNTLY",
+            "STARBUCKS COFFEE SYDNEY",
+            "MCDONALD'S ORMOND",
+            "NETFLIX",
+            "COMPLETELY DIFFERENT",
+        ]
+        for query in queries:
+            self.assertEqual(index.best_match(query), self.difflib_match(query, self.keys))
+
+    def test_large_index_matches_difflib(self):
+        """Test candidate pruning on a mapping larger than max_candidates"""
+        keys = [f"{key} {store:04d}" for key in self.keys for store in range(40)]
+        index = FuzzyIndex(keys, max_candidates=20)
+        queries = [
+            "WOOLWORTHS 3153 GLEN HU GLENHUNTLY 0007",
+            "STARBUCKS COFFEE MELBOURNE 0031",
+            "BUNNINGS WAREHOUSE OAKLEIGH 0012",
+        ]
+        for query in queries:
+            self.assertEqual(index.best_match(query), self.difflib_match(query, keys))
+
+    def test_incremental_add(self):
+        """Test that added keys become searchable"""
+        index = FuzzyIndex(self.keys)
+        self.assertIsNone(index.best_match("SPOTIFY PREMIUM"))
+
+        index.add("SPOTIFY PREMIUM SUBSCRIPTION")
+        index.add("SPOTIFY PREMIUM SUBSCRIPTION")  # Duplicate adds are ignored
+        self.assertEqual(len(index), len(self.keys) + 1)
+        self.assertEqual(index.best_match("SPOTIFY PREMIUM SUBSCRIPT"), "SPOTIFY PREMIUM SUBSCRIPTION")
+
+if __name__ == '__main__':
+    unittest.main()
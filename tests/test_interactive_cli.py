@@ -0,0 +1,73 @@
+import unittest
+import sys
+from pathlib import Path
+import tempfile
+import shutil
+import json
+from unittest.mock import patch
+
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from category_manager import CategoryManager
+from interactive_cli import InteractiveCLI
+
+class TestInteractiveCLI(unittest.TestCase):
+    """Test cases for InteractiveCLI class"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.temp_dir = tempfile.mkdtemp()
+        mapping_file = Path(self.temp_dir) / 'category_mapping.json'
+        patterns_file = Path(self.temp_dir) / 'pattern_mapping.json'
+        mapping_file.write_text(json.dumps({"NETFLIX.COM": "entertainment"}))
+        patterns_file.write_text(json.dumps({}))
+        self.cm = CategoryManager(mapping_file=str(mapping_file), patterns_file=str(patterns_file), snapshot=False)
+        self.cli = InteractiveCLI(self.cm)
+
+        self.monthly_data = {
+            '202501': pd.DataFrame({
+                'description': ['GYM MEMBERSHIP', 'NETFLIX.COM', 'PARKING LOT 7', 'GYM MEMBERSHIP'],
+                'amount': [-50.0, -15.0, -4.0, -50.0],
+            }),
+            '202502': pd.DataFrame({
+                'description': ['PARKING LOT 7', 'LANDLORD SMITH', 'GYM MEMBERSHIP'],
+                'amount': [-4.0, -2000.0, -50.0],
+            }),
+        }
+        for df in self.monthly_data.values():
+            self.cm.apply_categories(df)
+
+    def tearDown(self):
+        """Clean up after each test method"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_collect_unmapped_across_months(self):
+        """Test that unmapped descriptions are deduplicated and ranked by frequency, then amount"""
+        unmapped = InteractiveCLI.collect_unmapped(self.monthly_data)
+        self.assertEqual(unmapped['description'].tolist(), ['GYM MEMBERSHIP', 'PARKING LOT 7', 'LANDLORD SMITH'])
+        self.assertEqual(unmapped['count'].tolist(), [3, 2, 1])
+        self.assertEqual(unmapped['months'].tolist(), [2, 2, 1])
+        self.assertEqual(unmapped['total_amount'].tolist(), [150.0, 8.0, 2000.0])
+
+    def test_update_all_categories_prompts_once(self):
+        """Test that each description is asked once and only affected rows are recategorized"""
+        answers = iter(['fitness', 'skip', 'housing'])
+        with patch('builtins.input', lambda prompt='': next(answers)), patch('builtins.print'):
+            self.cli.update_all_categories(self.monthly_data)
+
+        self.assertEqual(self.monthly_data['202501']['comment'].tolist(), ['fitness', 'entertainment', None, 'fitness'])
+        self.assertEqual(self.monthly_data['202502']['comment'].tolist(), [None, 'housing', 'fitness'])
+
+        # Rows with an exact mapping from before the session are not recategorized
+        with patch.object(self.cm, 'categorize_series', wraps=self.cm.categorize_series) as categorize, \
+                patch('builtins.input', side_effect=['transport']), patch('builtins.print'):
+            self.cli.update_all_categories(self.monthly_data)
+        recategorized = set(categorize.call_args[0][0])
+        self.assertEqual(recategorized, {'PARKING LOT 7'})
+        self.assertEqual(self.monthly_data['202502']['comment'].tolist(), ['transport', 'housing', 'fitness'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,11 +5,12 @@ import tempfile
 import shutil
 import pandas as pd
 import json
+from unittest.mock import patch
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from learning_mode import LearningMode
+from learning_mode import LearningMode, find_learning_files
 from category_manager import CategoryManager
 
 class TestLearningMode(unittest.TestCase):
@@ -74,6 +75,180 @@ class TestLearningMode(unittest.TestCase):
         self.assertEqual(self.cm.get_exact_match('NEW MERCHANT 1'), 'groceries')
         self.assertEqual(self.cm.get_exact_match('NEW MERCHANT 2'), 'coffee')
     
+    def test_learn_existing_categories_bulk(self):
+        """Test that duplicates are collapsed, new mappings are written once and conflicts are queued"""
+        test_data = pd.DataFrame({
+            'description': ['NEW MERCHANT 1', 'NEW MERCHANT 1', 'NEW MERCHANT 2', 'EXISTING MERCHANT',
+                            'NEW MERCHANT 2', 'EXISTING MERCHANT'],
+            'category': ['groceries', 'groceries', 'coffee', 'dining', 'fast food', 'existing_category']
+        })
+        
+        with patch.object(self.cm, 'save_mapping', wraps=self.cm.save_mapping) as save_mapping, \
+                patch('builtins.input', side_effect=['e', 'n']) as prompt, patch('builtins.print'):
+            learned_count = self.learning_mode._learn_existing_categories(test_data)
+        
+        # New mappings and updates from the conflict queue are written once, together
+        self.assertEqual(save_mapping.call_count, 1)
+        self.assertEqual(prompt.call_count, 2)
+        self.assertEqual(learned_count, 3)
+        self.assertEqual(self.cm.get_exact_match('NEW MERCHANT 1'), 'groceries')
+        self.assertEqual(self.cm.get_exact_match('EXISTING MERCHANT'), 'existing_category')
+        self.assertEqual(self.cm.get_exact_match('NEW MERCHANT 2'), 'fast food')
+        self.assertEqual(self.cm.mapping['NEW MERCHANT 1']['comment'], 'UNCONFIRMED')
+    
+    def test_diff_mappings(self):
+        """Test the vectorized diff against the existing mapping"""
+        test_data = pd.DataFrame({
+            'description': ['EXISTING MERCHANT', 'NEW MERCHANT 1', 'EXISTING MERCHANT', 'EXISTING MERCHANT'],
+            'category': ['existing_category', 'groceries', 'dining', 'dining']
+        })
+        
+        additions, conflicts = self.learning_mode._diff_pairs(LearningMode._aggregate_pairs(test_data))
+        
+        self.assertEqual(additions, {'NEW MERCHANT 1': 'groceries'})
+        self.assertEqual(conflicts[['description', 'existing', 'category', 'count']].to_dict('records'), [
+            {'description': 'EXISTING MERCHANT', 'existing': 'existing_category', 'category': 'dining', 'count': 2}
+        ])
+    
+    def conflict_data(self):
+        """EXISTING MERCHANT is mapped to existing_category, NEW MERCHANT 1 has inconsistent categories"""
+        return pd.DataFrame({
+            'date': ['2025-03-01', '2025-01-01', '2025-02-01', '2025-01-05', '2025-04-01', '2025-02-05'],
+            'description': ['EXISTING MERCHANT', 'EXISTING MERCHANT', 'EXISTING MERCHANT',
+                            'NEW MERCHANT 1', 'NEW MERCHANT 1', 'NEW MERCHANT 1'],
+            'category': ['dining', 'dining', 'existing_category', 'groceries', 'household', 'household'],
+        })
+    
+    def fresh_manager(self):
+        """A CategoryManager on an untouched copy of the test mapping"""
+        directory = Path(tempfile.mkdtemp(dir=self.temp_dir))
+        shutil.copy(self.mapping_file, directory / self.mapping_file.name)
+        return CategoryManager(mapping_file=str(directory / self.mapping_file.name))
+    
+    def test_conflict_policies(self):
+        """Test that every non-interactive policy resolves conflicts without prompting"""
+        expected = {
+            'keep-existing': ('existing_category', 'groceries'),
+            'prefer-new': ('dining', 'household'),
+            'majority': ('dining', 'household'),
+            'most-recent': ('dining', 'household'),
+        }
+        for policy, (existing_merchant, new_merchant) in expected.items():
+            with self.subTest(policy=policy):
+                cm = self.fresh_manager()
+                learning_mode = LearningMode(cm, conflict_policy=policy)
+                with patch('builtins.input', side_effect=AssertionError('prompted')), patch('builtins.print'):
+                    learning_mode._learn_existing_categories(self.conflict_data())
+                self.assertEqual(cm.get_exact_match('EXISTING MERCHANT'), existing_merchant)
+                self.assertEqual(cm.get_exact_match('NEW MERCHANT 1'), new_merchant)
+        
+        # most-recent is decided by date
+        cm = self.fresh_manager()
+        data = self.conflict_data().assign(date=['2025-01-01', '2025-02-01', '2025-03-01',
+                                                 '2025-01-05', '2025-04-01', '2025-02-05'])
+        with patch('builtins.print'):
+            LearningMode(cm, conflict_policy='most-recent')._learn_existing_categories(data)
+        self.assertEqual(cm.get_exact_match('EXISTING MERCHANT'), 'existing_category')
+        
+        # On a tie, majority keeps the existing mapping
+        cm = self.fresh_manager()
+        with patch('builtins.print'):
+            LearningMode(cm, conflict_policy='majority')._learn_existing_categories(self.conflict_data().iloc[1:3])
+        self.assertEqual(cm.get_exact_match('EXISTING MERCHANT'), 'existing_category')
+    
+    def test_conflict_report(self):
+        """Test the machine-readable conflict report of an unattended run"""
+        learning_mode = LearningMode(self.cm, conflict_policy='ask', interactive=False)
+        with patch('builtins.input', side_effect=AssertionError('prompted')), patch('builtins.print'):
+            learning_mode._learn_existing_categories(self.conflict_data())
+            report_file = Path(self.temp_dir) / 'reports' / 'conflicts.json'
+            learning_mode.write_conflict_report(report_file)
+        
+        # Unresolved conflicts leave the existing mapping unchanged
+        self.assertEqual(self.cm.get_exact_match('EXISTING MERCHANT'), 'existing_category')
+        with open(report_file) as f:
+            report = json.load(f)
+        self.assertEqual(report['policy'], 'ask')
+        self.assertEqual(report['summary'], {'updated': 0, 'kept': 0, 'skipped': 0, 'unresolved': 2})
+        self.assertEqual(report['conflicts'][0], {
+            'description': 'EXISTING MERCHANT', 'existing': 'existing_category', 'existing_count': 1,
+            'category': 'dining', 'count': 2, 'last_seen': '2025-03-01',
+            'policy': 'ask', 'resolution': None, 'action': 'unresolved',
+        })
+        
+        with self.assertRaises(ValueError):
+            LearningMode(self.cm, conflict_policy='newest')
+    
+    def create_learning_dir(self):
+        """Three monthly learning files plus one with the wrong columns"""
+        learning_dir = Path(self.temp_dir) / 'learning'
+        learning_dir.mkdir()
+        months = {
+            '202501': [('NEW MERCHANT 1', 'groceries'), ('EXISTING MERCHANT', 'dining'), ('UNKNOWN SHOP', '')],
+            '202502': [('NEW MERCHANT 1', 'household'), ('EXISTING MERCHANT', 'dining'), ('UNKNOWN SHOP', '')],
+            '202503': [('NEW MERCHANT 1', 'household'), ('NEW MERCHANT 2', 'coffee')],
+        }
+        for month, rows in months.items():
+            pd.DataFrame({
+                'date': [f"{month[:4]}-{month[4:]}-0{day + 1}" for day in range(len(rows))],
+                'description': [description for description, _ in rows],
+                'amount': [10.0] * len(rows),
+                'category': [category for _, category in rows],
+                'bank': ['Test Bank'] * len(rows),
+            }).to_csv(learning_dir / f"{month}.csv", index=False)
+        pd.DataFrame({'date': ['2025-04-01'], 'description': ['TEST']}).to_csv(learning_dir / '202504.csv', index=False)
+        return learning_dir
+    
+    def test_find_learning_files(self):
+        """Test expanding a file, a directory or a glob pattern"""
+        learning_dir = self.create_learning_dir()
+        names = lambda paths: [path.name for path in paths]
+        self.assertEqual(names(find_learning_files(learning_dir)), ['202501.csv', '202502.csv', '202503.csv', '202504.csv'])
+        self.assertEqual(names(find_learning_files(str(learning_dir / '20250[23].csv'))), ['202502.csv', '202503.csv'])
+        self.assertEqual(find_learning_files(str(self.test_csv)), [self.test_csv])
+    
+    def test_learn_from_files(self):
+        """Test that votes from all files are aggregated and committed once"""
+        files = find_learning_files(self.create_learning_dir())
+        
+        results = {}
+        for workers, pool in ((1, 'thread'), (2, 'thread'), (2, 'process')):
+            with self.subTest(workers=workers, pool=pool):
+                cm = self.fresh_manager()
+                learning_mode = LearningMode(cm, conflict_policy='majority', interactive=False)
+                with patch.object(cm, 'save_mapping', wraps=cm.save_mapping) as save_mapping, patch('builtins.print'):
+                    self.assertTrue(learning_mode.learn_from_files(files, workers=workers, pool=pool))
+                self.assertEqual(save_mapping.call_count, 1)
+                results[(workers, pool)] = (cm._get_category_lookup(), learning_mode.conflicts)
+        
+        lookup, conflicts = results[(1, 'thread')]
+        self.assertEqual(lookup, {
+            'EXISTING MERCHANT': 'dining', 'NEW MERCHANT 1': 'household', 'NEW MERCHANT 2': 'coffee',
+        })
+        self.assertEqual([(conflict['description'], conflict['count'], conflict['existing_count']) for conflict in conflicts],
+                         [('EXISTING MERCHANT', 2, 0), ('NEW MERCHANT 1', 2, 1)])
+        for result in results.values():
+            self.assertEqual(result, results[(1, 'thread')])
+        
+        # Fails when none of the files is valid
+        with patch('builtins.print'):
+            self.assertFalse(self.learning_mode.learn_from_files(files[-1:]))
+    
+    def test_learn_normalized_descriptions(self):
+        """Test that descriptions differing only in volatile parts vote for one mapping"""
+        matching_file = Path(self.temp_dir) / 'matching.json'
+        matching_file.write_text(json.dumps({'normalization': {'enabled': True}}))
+        cm = CategoryManager(mapping_file=str(self.mapping_file), matching_file=str(matching_file))
+        test_data = pd.DataFrame({
+            'description': ['EXISTING MERCHANT 12', 'CAFE 1 AUS Card xx2644', 'CAFE 2 AUS Card xx2644', 'CAFE 3'],
+            'category': ['existing_category', 'coffee', 'coffee', 'bakery']
+        })
+        
+        with patch('builtins.print'):
+            LearningMode(cm, conflict_policy='majority')._learn_existing_categories(test_data)
+        
+        self.assertEqual(cm._get_category_lookup(), {'EXISTING MERCHANT': 'existing_category', 'CAFE 1 AUS Card xx2644': 'coffee'})
+    
     def test_csv_format_validation(self):
         """Test CSV format validation"""
         # Create invalid CSV (missing required columns)
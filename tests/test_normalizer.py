@@ -0,0 +1,56 @@
+import unittest
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from normalizer import DescriptionNormalizer
+
+class TestDescriptionNormalizer(unittest.TestCase):
+    """Test cases for DescriptionNormalizer"""
+
+    def test_default_rules(self):
+        """Test stripping value dates, card suffixes, digit tokens and extra whitespace"""
+        normalizer = DescriptionNormalizer()
+        cases = {
+            "Workshop Glenhuntly Glen Huntly VI AUS Card xx2644 Value Date: 29/06/2025": "WORKSHOP GLENHUNTLY GLEN HUNTLY VI",
+            "Workshop Glenhuntly Glen Huntly VI": "WORKSHOP GLENHUNTLY GLEN HUNTLY VI",
+            "AMAZON PURCHASE #456": "AMAZON PURCHASE",
+            "Direct Debit 000187 CBHS 10134206": "DIRECT DEBIT CBHS",
+            "GYMBAROO MALVERN        SOUTH MELBOURNE": "GYMBAROO MALVERN SOUTH MELBOURNE",
+            # Words that are not only digits are kept
+            "Mitchells Quality Meats 359-365 Clayt AU": "MITCHELLS QUALITY MEATS 359-365 CLAYT AU",
+            # Descriptions that would be removed entirely are kept as they are
+            "123456": "123456",
+        }
+        for description, expected in cases.items():
+            with self.subTest(description=description):
+                self.assertEqual(normalizer.normalize(description), expected)
+
+        series = pd.Series(list(cases), dtype=object)
+        self.assertEqual(normalizer.normalize_series(series).tolist(), list(cases.values()))
+
+    def test_options(self):
+        """Test switching rules off and adding extra patterns"""
+        normalizer = DescriptionNormalizer(uppercase=False, strip_digit_tokens=False, extra_patterns=[r'\bPTY LTD\b'])
+        self.assertEqual(normalizer.normalize("PETSTOCK PTY LTD  ORMOND 3204"), "PETSTOCK ORMOND 3204")
+        self.assertEqual(DescriptionNormalizer(enabled=False).normalize("A  1"), "A  1")
+
+        with self.assertRaises(ValueError):
+            DescriptionNormalizer(strip_everything=True)
+        with self.assertRaises(ValueError):
+            DescriptionNormalizer(extra_patterns=['('])
+
+    def test_partial_config(self):
+        """Test that options missing from matching.json keep their defaults"""
+        self.assertFalse(DescriptionNormalizer(enabled=False).enabled)
+        normalizer = DescriptionNormalizer(enabled=True, strip_card_suffixes=False)
+        self.assertTrue(normalizer.enabled)
+        self.assertEqual(normalizer.normalize("SHOP 3133 AUS Card xx2644"), "SHOP AUS CARD XX2644")
+        self.assertNotEqual(normalizer.config_key(), DescriptionNormalizer().config_key())
+
+if __name__ == '__main__':
+    unittest.main()
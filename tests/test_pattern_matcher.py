@@ -0,0 +1,86 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from pattern_matcher import PatternMatcher
+from category_manager import BUILT_IN_PATTERNS
+
+class TestPatternMatcher(unittest.TestCase):
+    """Test cases for PatternMatcher class"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.patterns = {
+            "CONTAINS:UBER EATS": "food delivery",
+            "REGEX:^NETFLIX\\s": "entertainment",
+            "coffee club": "cafe",
+            "CONTAINS:ay": "never matches upper case",
+        }
+        self.matcher = PatternMatcher(self.patterns, BUILT_IN_PATTERNS)
+
+    def test_user_patterns_before_built_ins(self):
+        """Test that user patterns win over built-in keywords"""
+        self.assertEqual(self.matcher.match("UBER EATS SYDNEY"), "food delivery")
+        self.assertEqual(self.matcher.match("UBER TRIP"), "transport")
+        self.assertEqual(self.matcher.match("THE COFFEE CLUB"), "cafe")
+
+    def test_insertion_order_priority(self):
+        """Test that earlier rules win when several match"""
+        matcher = PatternMatcher({"CONTAINS:KFC": "first", "CONTAINS:KFC CLAYTON": "second"})
+        self.assertEqual(matcher.match("KFC CLAYTON"), "first")
+
+        # Built-in groups keep their order: groceries is checked before coffee
+        self.assertEqual(self.matcher.match("COLES CAFE"), "groceries")
+
+    def test_regex_patterns(self):
+        """Test REGEX: rules inside the priority order"""
+        self.assertEqual(self.matcher.match("NETFLIX MONTHLY"), "entertainment")
+        self.assertEqual(self.matcher.match("MY NETFLIX"), None)
+
+    def test_combined_regex_mode(self):
+        """Test that the combined alternation picks the same rule as separate searches"""
+        patterns = {
+            "REGEX:WOOL(WORTHS)?\\s+\\d+": "supermarket",
+            "CONTAINS:SALARY": "salary",
+            "REGEX:^DIRECT (DEBIT|CREDIT)": "direct",
+            "REGEX:NETFLIX|SPOTIFY": "streaming",
+        }
+        separate = PatternMatcher(patterns, BUILT_IN_PATTERNS)
+        combined = PatternMatcher(patterns, BUILT_IN_PATTERNS, combine_regex=True)
+        self.assertIsNotNone(combined.combined_regex)
+        
+        descriptions = [
+            "WOOLWORTHS 3153 GLEN HU", "DIRECT CREDIT SALARY", "SALARY DIRECT CREDIT",
+            "SPOTIFY PREMIUM", "WOOL 12 NETFLIX", "COLES", "UNKNOWN",
+        ]
+        for description in descriptions:
+            self.assertEqual(combined.match(description), separate.match(description))
+
+    def test_combined_regex_falls_back_on_backreferences(self):
+        """Test that regexes with numbered backreferences are not merged"""
+        matcher = PatternMatcher({"REGEX:(\\d)\\1": "repeated digit"}, combine_regex=True)
+        self.assertIsNone(matcher.combined_regex)
+        self.assertEqual(matcher.match("STORE 447"), "repeated digit")
+
+    def test_invalid_regex_is_recorded(self):
+        """Test that invalid regexes are reported at compile time and skipped"""
+        matcher = PatternMatcher({"REGEX:[unclosed": "broken", "CONTAINS:KFC": "fast food"})
+        self.assertEqual([pattern for pattern, _ in matcher.invalid_patterns], ["REGEX:[unclosed"])
+        self.assertEqual(matcher.match("KFC [UNCLOSED"), "fast food")
+
+    def test_contains_keyword_is_case_sensitive(self):
+        """Test that CONTAINS: keywords are not upper-cased, as before"""
+        self.assertEqual(self.matcher.match("PAYPAL"), "income")
+
+    def test_overlapping_keywords(self):
+        """Test keywords that overlap or end inside other keywords"""
+        matcher = PatternMatcher({"CONTAINS:ABCD": "long", "CONTAINS:BC": "short"})
+        self.assertEqual(matcher.match("XABCDX"), "long")
+        self.assertEqual(matcher.match("XABCX"), "short")
+        self.assertIsNone(matcher.match("XACBX"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sys
+from pathlib import Path
+import tempfile
+import shutil
+import json
+
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from category_manager import CategoryManager
+from pipeline import categorize_months
+
+class TestPipeline(unittest.TestCase):
+    """Test cases for the monthly categorization pipeline"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.temp_dir = tempfile.mkdtemp()
+        mapping_file = Path(self.temp_dir) / 'category_mapping.json'
+        patterns_file = Path(self.temp_dir) / 'pattern_mapping.json'
+        mapping_file.write_text(json.dumps({"BUNNINGS WAREHOUSE": "home", "NETFLIX.COM": "entertainment"}))
+        patterns_file.write_text(json.dumps({"REGEX:^UBER\\s+EATS": "food delivery"}))
+        self.cm = CategoryManager(mapping_file=str(mapping_file), patterns_file=str(patterns_file), snapshot=False)
+
+        descriptions = ["BUNNINGS WAREHOUS", "NETFLIX.COM", "UBER EATS SYDNEY", "COLES 123", "MYSTERY SHOP", None]
+        self.monthly_data = {
+            f"2025{month:02d}": pd.DataFrame({
+                'date': pd.to_datetime([f"2025-{month:02d}-01"] * 6),
+                'description': descriptions[month % 3:] + descriptions[:month % 3],
+                'amount': [float(month)] * 6,
+            })
+            for month in range(1, 7)
+        }
+
+    def tearDown(self):
+        """Clean up after each test method"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_parallel_matches_sequential(self):
+        """Test that the process pool gives the same, ordered results as apply_categories"""
+        expected = {month: self.cm.apply_categories(df.copy()) for month, df in self.monthly_data.items()}
+
+        monthly_data = {month: df.copy() for month, df in self.monthly_data.items()}
+        results = list(categorize_months(monthly_data, self.cm, workers=3))
+        self.assertEqual([month for month, _ in results], list(expected))
+        for month, df in results:
+            pd.testing.assert_frame_equal(df, expected[month])
+
+    def test_single_worker_uses_manager(self):
+        """Test that one worker categorizes in-process through the manager"""
+        results = dict(categorize_months(self.monthly_data, self.cm, workers=1))
+        self.assertEqual(results['202501']['comment'].tolist()[:2], ["entertainment", "food delivery"])
+        self.assertGreater(self.cm.cache_stats()['misses'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
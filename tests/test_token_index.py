@@ -0,0 +1,61 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from token_index import TokenIndex, tokenize
+
+class TestTokenIndex(unittest.TestCase):
+    """Test cases for TokenIndex class"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.keys = [
+            "WOOLWORTHS 3153 GLEN HU GLENHUNTLY",
+            "BUNNINGS WAREHOUSE 6438 OAKLEIGH SOUTH",
+            "PETBARN CAULFIELD CAULFIELD SOUTH",
+            "CHEMIST WAREHOUSE KOORN CARNEGIE",
+            "STARBUCKS COFFEE MELBOURNE",
+            "HOYTS SYDNEY",
+        ]
+
+    def test_tokenize(self):
+        """Test that digits-only and single-character tokens are dropped"""
+        self.assertEqual(tokenize("McDonald's 0401 Ormond VIC 3204 A"), {"MCDONALD'S", "ORMOND", "VIC"})
+
+    def test_rare_tokens_decide(self):
+        """Test that a shared rare merchant token outweighs shared common tokens"""
+        index = TokenIndex(self.keys)
+        self.assertEqual(index.best_match("WOOLWORTHS 3133 GLENHUNTLY"), "WOOLWORTHS 3153 GLEN HU GLENHUNTLY")
+        # WAREHOUSE appears in two keys, so it weighs less than BUNNINGS
+        self.assertEqual(index.best_match("BUNNINGS WAREHOUSE NUNAWADING"), "BUNNINGS WAREHOUSE 6438 OAKLEIGH SOUTH")
+        self.assertIsNone(index.best_match("OFFICEWORKS WAREHOUSE NUNAWADING"))
+        # Sharing only a common word (SOUTH) is not enough to match
+        self.assertIsNone(index.best_match("MELBOURNE SOUTH MARKET"))
+        self.assertIsNone(index.best_match("1234"))
+        self.assertIsNone(TokenIndex().best_match("WOOLWORTHS"))
+
+    def test_common_tokens_fallback(self):
+        """Test candidates are still found when every shared token has a long posting list"""
+        keys = [f"WOOLWORTHS METRO STORE{number}" for number in range(30)] + ["WOOLWORTHS METRO"] + self.keys
+        index = TokenIndex(keys, max_postings=10)
+        self.assertEqual(index.best_match("METRO WOOLWORTHS"), "WOOLWORTHS METRO")
+        self.assertEqual(index.best_match("WOOLWORTHS METRO STORE7"), "WOOLWORTHS METRO STORE7")
+
+    def test_incremental_add_and_state(self):
+        """Test that adding keys updates the weights and that the state round-trips"""
+        index = TokenIndex(self.keys)
+        self.assertIsNone(index.best_match("BAKERS DELIGHT CARNEGIE"))
+        index.add("BAKERS DELIGHT MALVERN")
+        self.assertEqual(index.best_match("BAKERS DELIGHT CARNEGIE"), "BAKERS DELIGHT MALVERN")
+        self.assertIn("BAKERS DELIGHT MALVERN", index)
+
+        restored = TokenIndex.from_state(index.to_state())
+        self.assertEqual(len(restored), len(index))
+        for query in ("BAKERS DELIGHT CARNEGIE", "STARBUCKS SYDNEY", "HOYTS CHADSTONE"):
+            self.assertEqual(restored.best_match(query), index.best_match(query))
+
+if __name__ == '__main__':
+    unittest.main()